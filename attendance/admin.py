@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import Attendance
+from .models import Attendance, AttendanceSummary
 
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
     list_display = ('student', 'course', 'date', 'status', 'created_at')
     list_filter = ('status', 'date', 'course')
     search_fields = ('student__username', 'course__name')
+
+@admin.register(AttendanceSummary)
+class AttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'present', 'late', 'absent', 'updated_at')
+    list_filter = ('course',)
+    search_fields = ('student__username', 'course__name')
@@ -0,0 +1,170 @@
+import asyncio
+import weakref
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from asgiref.sync import sync_to_async
+from .models import Attendance
+from .services import (
+    SESSION_TTL, CLAIM_ALREADY_RECORDED, PENDING_TTL, CHECKIN_STREAM, ENROLLMENT_LOADED,
+    session_key, claim_key, pending_key, enrollment_key, load_enrollment_sets, is_active, cached_session, remember_session,
+    evaluate_check_in, events_channel, _events_message, add_to_summary, session_date,
+    MARK_PRESENCE_LUA, presence_script_args, _decode, _end_of_day, _claimed_result, _signed_mode
+)
+
+# Async counterpart of the check-in path in services.py, for the ASGI server.
+# Pure verification (evaluate_check_in) and the local session cache are shared.
+
+# One client per event loop: redis.asyncio connections cannot cross loops
+_clients = weakref.WeakKeyDictionary()
+
+def get_async_redis():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(settings.CELERY_BROKER_URL)
+        _clients[loop] = client
+    return client
+
+async def acache_course_location(course_id):
+    """
+    Async cache_course_location: reads the course, stores its location in the session hash.
+    """
+    from courses.models import Course
+    try:
+        course = await Course.objects.only('latitude', 'longitude', 'allowed_radius').aget(id=course_id)
+    except Course.DoesNotExist:
+        return None
+
+    has_location = course.latitude is not None and course.longitude is not None
+    data = {
+        'lat': course.latitude if has_location else '',
+        'lon': course.longitude if has_location else '',
+        'radius': course.allowed_radius
+    }
+    key = session_key(course_id)
+    async with get_async_redis().pipeline() as pipe:
+        pipe.hset(key, mapping=data)
+        pipe.expire(key, SESSION_TTL, nx=True)
+        await pipe.execute()
+    return data
+
+async def aget_session_state(course_id):
+    """
+    (is_open, secret) of the course session, read without opening it.
+    The secret is None in signed mode or when there is no session.
+    """
+    is_open, secret = await get_async_redis().hmget(session_key(course_id), 'open', 'secret')
+    secret = secret.decode('utf-8') if secret and not _signed_mode() else None
+    return is_open == b'1', secret
+
+async def _aload_session(course_id, raw):
+    state = _decode(raw)
+    if not is_active(state):
+        return None
+
+    if 'lat' not in state:
+        location = await acache_course_location(course_id)
+        if location is None:
+            return None
+        state.update({k: str(v) for k, v in location.items()})
+
+    remember_session(course_id, state)
+    return state
+
+def _arecord_attendance_change(pipe, course_id, date, student_id, status):
+    # record_attendance_changes() for one student, on an async pipeline
+    keys, args = presence_script_args(course_id, date, student_id, status)
+    pipe.eval(MARK_PRESENCE_LUA, len(keys), *keys, *args)
+    pipe.publish(events_channel(course_id, date), _events_message({student_id: status}))
+
+async def aenqueue_check_in(student_id, course_id, date, status):
+    key = pending_key(course_id, date)
+    async with get_async_redis().pipeline() as pipe:
+        pipe.xadd(CHECKIN_STREAM, {
+            'student_id': student_id,
+            'course_id': course_id,
+            'date': str(date),
+            'status': status
+        })
+        pipe.hset(key, student_id, status)
+        pipe.expire(key, PENDING_TTL)
+        _arecord_attendance_change(pipe, course_id, date, student_id, status)
+        await pipe.execute()
+
+def _record_check_in(student, course_id, date, status):
+    # Record and summary commit together, as in verify_attendance
+    with transaction.atomic():
+        Attendance.objects.create(
+            student=student,
+            course_id=course_id,
+            date=date,
+            status=status
+        )
+        add_to_summary(student.id, course_id, status)
+
+async def averify_attendance(student, course_id, code, lat, lon):
+    """
+    Async verify_attendance: same checks and Redis/DB cost, but waiting on
+    Redis does not hold a worker thread. The record and its summary are
+    written in one transaction, in a single sync_to_async call.
+    """
+    ar = get_async_redis()
+    today = session_date()
+    claim = claim_key(course_id, student.id, today)
+    state = cached_session(course_id)
+    async with ar.pipeline(transaction=False) as pipe:
+        if state is None:
+            pipe.hgetall(session_key(course_id))
+        pipe.smismember(enrollment_key(course_id), [student.id, ENROLLMENT_LOADED])
+        pipe.get(claim)
+        results = await pipe.execute()
+
+    claimed = results[-1]
+    if claimed:
+        return _claimed_result(claimed)
+
+    if state is None:
+        state = await _aload_session(course_id, results[0])
+    # Before the enrollment check, which may load the set from the DB
+    if state is None:
+        return False, "Attendance session not active."
+
+    member, loaded = results[-2]
+    if not loaded:
+        member = student.id in (await sync_to_async(load_enrollment_sets)([course_id]))[int(course_id)]
+    if not member:
+        return False, "You are not enrolled in this course."
+
+    success, message = evaluate_check_in(state, course_id, code, lat, lon)
+    if not success:
+        return False, message
+
+    status = Attendance.Status.PRESENT
+    if not await ar.set(claim, status, nx=True, exat=_end_of_day(today)):
+        # A concurrent request (double tap) won the claim
+        return _claimed_result(await ar.get(claim) or status.encode('utf-8'))
+
+    if settings.ATTENDANCE_WRITE_BEHIND:
+        try:
+            await aenqueue_check_in(student.id, course_id, today, status)
+        except Exception:
+            # Nothing was queued: let the student retry
+            await ar.delete(claim)
+            raise
+        return True, message
+
+    try:
+        await sync_to_async(_record_check_in)(student, course_id, today, status)
+    except IntegrityError:
+        # A record already exists (e.g. set manually by the professor)
+        await ar.set(claim, CLAIM_ALREADY_RECORDED, exat=_end_of_day(today))
+        return False, "Attendance already recorded for today."
+    except Exception:
+        await ar.delete(claim)
+        raise
+
+    async with ar.pipeline(transaction=False) as pipe:
+        _arecord_attendance_change(pipe, course_id, today, student.id, status)
+        await pipe.execute()
+    return True, message
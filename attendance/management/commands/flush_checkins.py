@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from attendance.services import flush_pending_check_ins
+
+class Command(BaseCommand):
+    help = "Persists all write-behind check-ins still queued in Redis."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        count = flush_pending_check_ins(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Flushed {count} check-ins."))
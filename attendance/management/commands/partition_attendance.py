@@ -0,0 +1,44 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from attendance import partitions
+
+class Command(BaseCommand):
+    help = (
+        "Postgres only. Manages monthly range partitions of Attendance: "
+        "--convert (one-off), create upcoming months, --archive-before a term start."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help="Rebuild the table as a partitioned table (locks it while copying)")
+        parser.add_argument('--ahead', type=int, default=3,
+                            help="Months past the current one to create partitions for (default 3)")
+        parser.add_argument('--archive-before', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                            help="Move months ending on or before this date to the archive table")
+        parser.add_argument('--list', action='store_true', help="Show active and archived partitions")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Attendance partitioning requires PostgreSQL.")
+
+        if options['convert']:
+            copied = partitions.convert_to_partitioned(months_ahead=options['ahead'])
+            self.stdout.write(self.style.SUCCESS(f"Attendance is partitioned ({copied} rows copied)."))
+
+        with connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor):
+                raise CommandError("Attendance is not partitioned yet; run with --convert first.")
+
+        through = partitions.add_months(partitions.month_start(date.today()), options['ahead'])
+        created = partitions.create_partitions(through)
+        self.stdout.write(f"Created {len(created)} partitions: {', '.join(created) or '-'}")
+
+        if options['archive_before']:
+            archived = partitions.archive_partitions(options['archive_before'])
+            self.stdout.write(self.style.SUCCESS(f"Archived {len(archived)} partitions: {', '.join(archived) or '-'}"))
+
+        if options['list']:
+            for state, months in partitions.list_partitions().items():
+                for month, name in months:
+                    self.stdout.write(f"{state:8} {month:%Y-%m} {name}")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from attendance.models import Attendance, AttendanceSummary
+from attendance.services import SUMMARY_FIELDS
+
+class Command(BaseCommand):
+    help = "Recomputes AttendanceSummary from the Attendance records."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help="Only these course ids (repeatable)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        records = Attendance.objects.all()
+        summaries = AttendanceSummary.objects.all()
+        if options['course']:
+            records = records.filter(course_id__in=options['course'])
+            summaries = summaries.filter(course_id__in=options['course'])
+
+        # One grouped pass over the history
+        counts = records.values('student_id', 'course_id').annotate(**{
+            field: Count('id', filter=Q(status=value)) for value, field in SUMMARY_FIELDS.items()
+        }).order_by()
+
+        with transaction.atomic():
+            summaries.delete()
+            AttendanceSummary.objects.bulk_create(
+                (AttendanceSummary(**row) for row in counts.iterator(chunk_size=options['batch_size'])),
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {summaries.count()} attendance summaries."))
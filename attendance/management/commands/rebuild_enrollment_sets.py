@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from courses.models import Course
+from attendance.services import load_enrollment_sets
+
+class Command(BaseCommand):
+    help = "Rebuilds the Redis enrollment sets (course_students:{id}) from Enrollment."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help="Only these course ids (repeatable)")
+        parser.add_argument('--batch-size', type=int, default=500, help="Courses per DB query / Redis pipeline")
+
+    def handle(self, *args, **options):
+        course_ids = options['course'] or list(Course.objects.filter(is_active=True).values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(course_ids), batch_size):
+            load_enrollment_sets(course_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt enrollment sets for {len(course_ids)} courses."))
@@ -0,0 +1,43 @@
+from collections import defaultdict
+from django.db import migrations
+from django.db.models import Count
+
+# Historical copy of services.SUMMARY_FIELDS
+SUMMARY_FIELDS = {'PRESENT': 'present', 'LATE': 'late', 'ABSENT': 'absent'}
+BATCH_SIZE = 1000
+
+
+def backfill_summaries(apps, schema_editor):
+    """
+    Fills AttendanceSummary from the existing records, so the stats endpoints
+    (which only read the summaries) are right from the first request.
+    """
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceSummary = apps.get_model('attendance', 'AttendanceSummary')
+
+    counts = defaultdict(dict)
+    rows = Attendance.objects.values('student', 'course', 'status').annotate(count=Count('id')).order_by()
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        field = SUMMARY_FIELDS.get(row['status'])
+        if field:
+            counts[(row['student'], row['course'])][field] = row['count']
+
+    AttendanceSummary.objects.bulk_create(
+        (
+            AttendanceSummary(student_id=student_id, course_id=course_id, **fields)
+            for (student_id, course_id), fields in counts.items()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_archivedattendance'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
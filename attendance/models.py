@@ -29,3 +29,58 @@ class Attendance(models.Model):
 
     def __str__(self):
         return f"{self.student} - {self.course} - {self.date} ({self.status})"
+
+class AttendanceSummary(models.Model):
+    """
+    Per-(student, course) status counts, kept up to date by the attendance
+    write paths in services.py so stats read one row instead of the history.
+    Rebuild with `manage.py rebuild_attendance_summary`.
+    """
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='attendance_summaries'
+    )
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attendance_summaries')
+    present = models.PositiveIntegerField(default=0)
+    late = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['course', 'student']),
+        ]
+
+    @property
+    def total(self):
+        return self.present + self.late + self.absent
+
+    def __str__(self):
+        return f"{self.student} - {self.course} (P{self.present}/L{self.late}/A{self.absent})"
+
+class ArchivedAttendance(models.Model):
+    """
+    Read-only view of past terms' attendance. The table is created and filled
+    by `manage.py partition_attendance --archive-before` (Postgres only),
+    which moves whole monthly partitions out of Attendance.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='archived_attendances'
+    )
+    course = models.ForeignKey(Course, on_delete=models.DO_NOTHING, db_constraint=False, related_name='archived_attendances')
+    date = models.DateField()
+    status = models.CharField(max_length=10, choices=Attendance.Status.choices)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'attendance_attendance_archive'
+
+    def __str__(self):
+        return f"{self.student} - {self.course} - {self.date} ({self.status}, archived)"
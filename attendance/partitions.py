@@ -0,0 +1,159 @@
+import re
+from datetime import date
+from django.db import connection, transaction
+from .models import Attendance, ArchivedAttendance
+
+# Optional Postgres range partitioning of Attendance by month on `date`.
+# The parent keeps its name, so the ORM is unchanged; queries filtered by date
+# only touch the matching partitions. Past months can be detached into the
+# archive table (ArchivedAttendance), which stays queryable.
+# Driven by `manage.py partition_attendance`.
+
+TABLE = Attendance._meta.db_table
+ARCHIVE_TABLE = ArchivedAttendance._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+def _partitions(cursor, parent):
+    """
+    {month: name} of the monthly partitions attached to a parent table.
+    """
+    cursor.execute("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+    """, [parent])
+    months = {}
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months[date(int(match[1]), int(match[2]), 1)] = name
+    return months
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table JOIN pg_class ON pg_class.oid = partrelid WHERE relname = %s", [TABLE])
+    return cursor.fetchone() is not None
+
+def list_partitions():
+    with connection.cursor() as cursor:
+        return {
+            'active': sorted(_partitions(cursor, TABLE).items()),
+            'archived': sorted(_partitions(cursor, ARCHIVE_TABLE).items()) if _table_exists(cursor, ARCHIVE_TABLE) else [],
+        }
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+def _create_partition(cursor, month):
+    """
+    Creates the partition for a month, moving any rows for it out of the
+    default partition first (Postgres refuses to attach over them otherwise).
+    """
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE date >= %s AND date < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        [start, end]
+    )
+    cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [start, end])
+
+def create_partitions(through):
+    """
+    Creates monthly partitions from the current month through `through`.
+    Returns the names created.
+    """
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = _partitions(cursor, TABLE)
+        archived = _partitions(cursor, ARCHIVE_TABLE) if _table_exists(cursor, ARCHIVE_TABLE) else {}
+        month = month_start(date.today())
+        while month <= month_start(through):
+            if month not in existing and month not in archived:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+    return created
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    One-off: rebuilds Attendance as a table partitioned by month, copying
+    every row. Takes an exclusive lock for the duration; run it in a
+    maintenance window. Returns the number of rows copied.
+    """
+    from courses.models import Course
+    from django.contrib.auth import get_user_model
+    user_table = get_user_model()._meta.db_table
+    course_table = Course._meta.db_table
+    old = f"{TABLE}_unpartitioned"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return 0
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old}"')
+        cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{TABLE}_pkey" TO "{old}_pkey"')
+
+        # The primary key and unique constraint must include the partition key.
+        # id keeps coming from a sequence; it stays unique, just not enforced across partitions.
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY RANGE (date)')
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_pid_seq" OWNED BY "{TABLE}".id')
+        cursor.execute(f"""SELECT setval('"{TABLE}_pid_seq"', COALESCE((SELECT MAX(id) FROM "{old}"), 0) + 1, false)""")
+        cursor.execute(f"""ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval('"{TABLE}_pid_seq"')""")
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, date)')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_student_course_date_uniq" UNIQUE (student_id, course_id, date)')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_student_id_fk" FOREIGN KEY (student_id) REFERENCES "{user_table}" (id) DEFERRABLE INITIALLY DEFERRED')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_course_id_fk" FOREIGN KEY (course_id) REFERENCES "{course_table}" (id) DEFERRABLE INITIALLY DEFERRED')
+        # Secondary indexes from Attendance.Meta, created per partition
+        for index in Attendance._meta.indexes:
+            cursor.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+            columns = ', '.join(Attendance._meta.get_field(field).column for field in index.fields)
+            cursor.execute(f'CREATE INDEX "{index.name}" ON "{TABLE}" ({columns})')
+
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+        cursor.execute(f'SELECT MIN(date) FROM "{old}"')
+        first = cursor.fetchone()[0] or date.today()
+        month, last = month_start(first), add_months(month_start(date.today()), months_ahead)
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE "{partition_name(month)}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+                [month, add_months(month, 1)]
+            )
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old}"')
+        copied = cursor.rowcount
+        cursor.execute(f'DROP TABLE "{old}"')
+    return copied
+
+def archive_partitions(before):
+    """
+    Detaches every monthly partition that ends on or before `before` (e.g. the
+    start of the current term) and attaches it to the archive table.
+    Returns the names archived.
+    """
+    archived = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{ARCHIVE_TABLE}" (LIKE "{TABLE}") PARTITION BY RANGE (date)'
+        )
+        for month, name in sorted(_partitions(cursor, TABLE).items()):
+            end = add_months(month, 1)
+            if end > before:
+                continue
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'ALTER TABLE "{ARCHIVE_TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [month, end])
+            archived.append(name)
+    return archived
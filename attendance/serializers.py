@@ -11,6 +11,20 @@ class AttendanceSerializer(serializers.ModelSerializer):
 
 class AttendanceCheckInSerializer(serializers.Serializer):
     course_id = serializers.IntegerField()
-    code = serializers.CharField(max_length=6)
+    code = serializers.CharField(max_length=16) # 6-digit TOTP or signed token
     lat = serializers.FloatField()
     lon = serializers.FloatField()
+
+class BulkCheckInItemSerializer(serializers.Serializer):
+    # Omitted for a student's own queued scans
+    student_id = serializers.IntegerField(required=False)
+    course_id = serializers.IntegerField()
+    code = serializers.CharField(max_length=16) # 6-digit TOTP or signed token
+    timestamp = serializers.DateTimeField()
+    lat = serializers.FloatField()
+    lon = serializers.FloatField()
+
+class AttendanceStatusItemSerializer(serializers.Serializer):
+    student_id = serializers.IntegerField()
+    date = serializers.DateField(required=False) # Defaults to today
+    status = serializers.ChoiceField(choices=Attendance.Status.choices)
@@ -1,120 +1,1219 @@
+import os
+import json
+import logging
+import threading
+from time import sleep
 import pyotp
 import redis
-from haversine import haversine, Unit
+import numpy as np
+from haversine import haversine, haversine_vector, Unit
 from django.conf import settings
-from datetime import datetime
-from .models import Attendance
+from datetime import datetime, time, timedelta
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from core.cache import TTLCache
+from core.redis_client import r
+from .models import Attendance, AttendanceSummary
+from .tokens import generate_signed_token, verify_signed_token
 
-# Redis connection
-r = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+logger = logging.getLogger(__name__)
+
+# Course session state lives in one Redis hash per course:
+#   course_session:{id} -> {secret, open, lat, lon, radius}
+# so a check-in reads everything it verifies in a single round-trip.
+SESSION_TTL = 3600 * 4 # Valid for 4 hours
+DEFAULT_RADIUS = 50
+
+# Process-local copy of hot session states, in front of Redis.
+# Workers drop entries when a course id is published on SESSION_INVALIDATION_CHANNEL.
+SESSION_INVALIDATION_CHANNEL = 'course_session:invalidate'
+session_cache = TTLCache(
+    maxsize=settings.ATTENDANCE_LOCAL_CACHE_SIZE,
+    ttl=settings.ATTENDANCE_LOCAL_CACHE_TTL
+)
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+def session_key(course_id):
+    return f"course_session:{course_id}"
+
+def _listen_for_invalidations():
+    backoff = 1
+    while True:
+        try:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(SESSION_INVALIDATION_CHANNEL)
+            backoff = 1
+            for message in pubsub.listen():
+                session_cache.invalidate(int(message['data']))
+        except Exception:
+            logger.warning("Session invalidation listener disconnected", exc_info=True)
+        # Invalidations may have been missed while disconnected
+        session_cache.clear()
+        sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+def _ensure_invalidation_listener():
+    """
+    Starts the pub/sub listener thread once per process (also after a fork).
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        session_cache.clear()
+        threading.Thread(target=_listen_for_invalidations, name='session-invalidation', daemon=True).start()
+        _listener_pid = os.getpid()
+
+def invalidate_course_session(course_id):
+    """
+    Drops the course's session state from every worker's local cache.
+    """
+    session_cache.invalidate(int(course_id))
+    r.publish(SESSION_INVALIDATION_CHANNEL, course_id)
+
+def _signed_mode():
+    return settings.ATTENDANCE_TOKEN_MODE == 'signed'
+
+def opened_key(course_id, date):
+    # Set whenever a session is shown that day; close_ended_sessions only closes those out
+    return f"session_opened:{course_id}:{date}"
+
+def open_course_session(course_id):
+    """
+    Opens the session without a per-session secret (signed token mode).
+    """
+    key = session_key(course_id)
+    today = session_date()
+    with r.pipeline(transaction=False) as pipe:
+        pipe.hget(key, 'open')
+        pipe.set(opened_key(course_id, today), 1, exat=_end_of_day(today))
+        is_open, _ = pipe.execute()
+    if is_open != b'1':
+        with r.pipeline() as pipe:
+            pipe.hset(key, 'open', 1)
+            pipe.expire(key, SESSION_TTL, nx=True)
+            pipe.publish(SESSION_INVALIDATION_CHANNEL, course_id)
+            pipe.execute()
+        session_cache.invalidate(int(course_id))
 
 def generate_qr_token(course_id):
     """
-    Generates a generic TOTP secret for the course or retrieves existing.
-    In a real app, this might be dynamic. 
-    Here we use a secret derived from course_id + date.
-    """
-    secret_key = f"COURSE_{course_id}_{datetime.now().strftime('%Y%m%d')}"
-    # Ensure key is base32 compatible or just use a stable secret mapping
-    # For simplicity, we create a random secret if not exists in Redis for this session
-    
-    # Store/Get a robust secret for this course session
-    key = f"attendance_secret:{course_id}"
-    secret = r.get(key)
-    if not secret:
-        secret = pyotp.random_base32()
-        r.setex(key, 3600 * 4, secret) # Valid for 4 hours
-    else:
-        secret = secret.decode('utf-8')
-        
+    Generates a TOTP secret for the course session or retrieves existing.
+    Also (re)opens the session for check-ins.
+    In signed mode the code is a stateless signed token and no secret is stored.
+    """
+    if _signed_mode():
+        open_course_session(course_id)
+        return generate_signed_token(course_id), None
+
+    key = session_key(course_id)
+    today = session_date()
+    with r.pipeline() as pipe:
+        pipe.hsetnx(key, 'secret', pyotp.random_base32())
+        pipe.hget(key, 'open')
+        pipe.hget(key, 'secret')
+        pipe.set(opened_key(course_id, today), 1, exat=_end_of_day(today))
+        created, is_open, secret, _ = pipe.execute()
+
+    if created or is_open != b'1':
+        # New secret or reopened session: other workers must drop their copy
+        with r.pipeline() as pipe:
+            pipe.hset(key, 'open', 1)
+            if created:
+                pipe.expire(key, SESSION_TTL)
+            pipe.publish(SESSION_INVALIDATION_CHANNEL, course_id)
+            pipe.execute()
+        session_cache.invalidate(int(course_id))
+
+    secret = secret.decode('utf-8')
     totp = pyotp.TOTP(secret, interval=30)
     return totp.now(), secret
 
-def verify_attendance(student, course, code, lat, lon):
+def qr_code_at(course_id, secret, for_time):
+    """
+    The QR code valid at for_time, computed locally from the session secret
+    (or the signing key in signed mode).
+    """
+    if _signed_mode():
+        return generate_signed_token(course_id, for_time=for_time)
+    return pyotp.TOTP(secret, interval=30).at(for_time)
+
+def close_course_session(course_id):
+    """
+    Closes the session so further check-ins are rejected.
+    The secret is kept; generating a code again reopens the session.
+    closed_at lets offline scans recorded before the close still be accepted.
+    """
+    key = session_key(course_id)
+    if r.exists(key):
+        r.hset(key, mapping={'open': 0, 'closed_at': datetime.now().timestamp()})
+        invalidate_course_session(course_id)
+
+def cache_course_location(course_id, course=None):
+    """
+    Caches course location in the session hash.
+    O(1) access during attendance burst.
+    An empty lat/lon marks a course without a location so the DB is not re-queried.
+    """
+    from courses.models import Course
+    if course is None:
+        try:
+            course = Course.objects.only('latitude', 'longitude', 'allowed_radius').get(id=course_id)
+        except Course.DoesNotExist:
+            return None
+
+    has_location = course.latitude is not None and course.longitude is not None
+    data = {
+        'lat': course.latitude if has_location else '',
+        'lon': course.longitude if has_location else '',
+        'radius': course.allowed_radius
+    }
+    key = session_key(course_id)
+    with r.pipeline() as pipe:
+        pipe.hset(key, mapping=data)
+        # Only give a TTL to new hashes, never extend an active session
+        pipe.expire(key, SESSION_TTL, nx=True)
+        pipe.execute()
+    return data
+
+def _decode(raw):
+    return {k.decode('utf-8'): v.decode('utf-8') for k, v in raw.items()}
+
+def is_active(state):
+    # generate_qr_token sets 'open' (and 'secret' in TOTP mode) when a session starts
+    if 'open' not in state:
+        return False
+    return _signed_mode() or bool(state.get('secret'))
+
+def _load_session(course_id, raw, require_active=True):
+    """
+    Decodes a session hash, filling the location from the DB if missing,
+    and keeps it in the local cache.
+    """
+    state = _decode(raw)
+    if require_active and not is_active(state):
+        return None
+
+    if 'lat' not in state:
+        location = cache_course_location(course_id)
+        if location is None:
+            return None
+        state.update({k: str(v) for k, v in location.items()})
+
+    remember_session(course_id, state)
+    return state
+
+def remember_session(course_id, state):
+    if session_cache.enabled:
+        _ensure_invalidation_listener()
+        session_cache.set(int(course_id), state)
+
+def cached_session(course_id, require_active=True):
+    state = session_cache.get(int(course_id))
+    if state is None or (require_active and not is_active(state)):
+        return None
+    return state
+
+def get_course_session(course_id):
+    """
+    Returns the course session state as a dict of strings
+    (secret (TOTP mode only), open, lat, lon, radius), or None if no session is active.
+    Local cache first, then one HGETALL; the DB only if the location is not cached yet.
+    """
+    state = cached_session(course_id)
+    if state is None:
+        state = _load_session(course_id, r.hgetall(session_key(course_id)))
+    return state
+
+def get_course_sessions(course_ids):
+    """
+    Returns {course_id: state} for the active sessions among course_ids.
+    Local cache first, then one pipelined HGETALL for the misses.
+    """
+    states = {}
+    missing = []
+    for course_id in course_ids:
+        state = cached_session(course_id)
+        if state is None:
+            missing.append(course_id)
+        else:
+            states[course_id] = state
+
+    if missing:
+        with r.pipeline(transaction=False) as pipe:
+            for course_id in missing:
+                pipe.hgetall(session_key(course_id))
+            raws = pipe.execute()
+        for course_id, raw in zip(missing, raws):
+            state = _load_session(course_id, raw)
+            if state is not None:
+                states[course_id] = state
+    return states
+
+def get_course_location(course_id):
+    """
+    Returns (lat, lon, radius).
+    Tries the local cache, then Redis, then DB.
+    """
+    state = cached_session(course_id, require_active=False)
+    if state is None:
+        state = _load_session(course_id, r.hgetall(session_key(course_id)), require_active=False)
+        if state is None:
+            return None, None, DEFAULT_RADIUS
+
+    radius = int(state.get('radius') or DEFAULT_RADIUS)
+    if not state['lat'] or not state['lon']:
+        return None, None, radius
+    return float(state['lat']), float(state['lon']), radius
+
+def _was_open_at(state, for_time):
+    # A scan recorded (for_time) before a closed session was closed
+    closed_at = state.get('closed_at')
+    if for_time is None or not closed_at:
+        return False
+    return for_time.timestamp() <= float(closed_at)
+
+def check_session_code(state, course_id, code, for_time=None, valid_window=0):
     """
-    Verifies attendance based on TOTP code and Geofencing (50m radius).
+    Checks the session is open, the QR code (at for_time, default now)
+    and that the course has a location. Returns (success, message).
     """
-    # Retrieve secret
-    key = f"attendance_secret:{course.id}"
-    secret = r.get(key)
-    if not secret:
+    if state is None:
         return False, "Attendance session not active."
-    
-    secret = secret.decode('utf-8')
-    totp = pyotp.TOTP(secret, interval=30)
-    
-    if not totp.verify(code):
+
+    if state.get('open') == '0' and not _was_open_at(state, for_time):
+        return False, "Attendance session is closed."
+
+    if _signed_mode():
+        skew = max(valid_window, settings.ATTENDANCE_TOKEN_SKEW)
+        valid = verify_signed_token(course_id, code, for_time=for_time, skew=skew)
+    else:
+        totp = pyotp.TOTP(state['secret'], interval=30)
+        valid = totp.verify(code, for_time=for_time, valid_window=valid_window)
+    if not valid:
         return False, "Invalid or expired QR code."
 
-    # 2. Verify Location (Geofencing)
-    # Optimization: Helper to get location from Redis or DB
-    target_lat, target_lon, allowed_radius = get_course_location(course.id)
-    
-    if target_lat is None or target_lon is None:
-         # Fallback if course has no location set (Optional: allow or fail)
-         # For strict attendance, we might fail.
-         # For now, if no location, maybe skip verify? Or fail.
-         return False, "Course location not configured."
+    if not state.get('lat') or not state.get('lon'):
+        return False, "Course location not configured."
+
+    return True, None
+
+def _location_failed(distance, allowed_radius):
+    return f"Location verification failed. Distance: {distance:.2f}m (Allowed: {allowed_radius}m)"
 
+def evaluate_check_in(state, course_id, code, lat, lon):
+    """
+    Checks a check-in against a session state without any I/O.
+    Returns (success, message).
+    """
+    success, message = check_session_code(state, course_id, code)
+    if not success:
+        return False, message
+
+    # Verify Location (Geofencing)
+    allowed_radius = int(state.get('radius') or DEFAULT_RADIUS)
     student_loc = (float(lat), float(lon))
-    course_loc = (float(target_lat), float(target_lon))
-    
+    course_loc = (float(state['lat']), float(state['lon']))
+
     distance = haversine(student_loc, course_loc, unit=Unit.METERS)
-    
+
     if distance > allowed_radius:
-        return False, f"Location verification failed. Distance: {distance:.2f}m (Allowed: {allowed_radius}m)"
-
-    # 3. Mark Attendance
-    Attendance.objects.create(
-        student=student,
-        course=course,
-        date=datetime.now().date(),
-        status=Attendance.Status.PRESENT
-    )
-    
+        return False, _location_failed(distance, allowed_radius)
+
     return True, "Attendance valid."
 
-def cache_course_location(course_id):
+# Duplicate guard: one claim per (course, student, day), set with SET NX
+# by the first accepted check-in and expiring at midnight.
+CLAIM_ALREADY_RECORDED = 'RECORDED'
+
+def claim_key(course_id, student_id, date):
+    return f"checkin_claim:{course_id}:{student_id}:{date}"
+
+def local_now():
     """
-    Caches course location in Redis for 1 hour.
-    O(1) access during attendance burst.
+    Wall-clock time in TIME_ZONE, naive like the CourseSchedule times.
     """
-    from courses.models import Course
+    return timezone.localtime().replace(tzinfo=None)
+
+def session_date(for_time=None):
+    """
+    The session day of a moment (default now) in TIME_ZONE. Every path keys
+    claims, records and close-out by it. Naive datetimes are taken as local.
+    """
+    if for_time is not None and timezone.is_naive(for_time):
+        return for_time.date()
+    return timezone.localdate(for_time)
+
+def _end_of_day(date):
+    return int(datetime.combine(date + timedelta(days=1), time.min).timestamp())
+
+def _claim_expiry(date):
+    # Offline uploads may claim past days; keep those claims briefly
+    return max(_end_of_day(date), int(datetime.now().timestamp()) + 60)
+
+def _claimed_result(claim):
+    if claim.decode('utf-8') == CLAIM_ALREADY_RECORDED:
+        return False, "Attendance already recorded for today."
+    return True, "Already checked in."
+
+# Live roster: accepted check-ins and manual status changes are published
+# per session so professors' roster streams update without re-querying.
+def events_channel(course_id, date):
+    return f"attendance_events:{course_id}:{date}"
+
+def _events_message(changes):
+    return json.dumps({"changes": [
+        {"student_id": int(student_id), "status": status} for student_id, status in changes.items()
+    ]})
+
+# Presence bitmaps: presence:{course}:{date} has one bit per student, at the
+# student's dense per-course index from presence_index:{course}
+# (student_id -> index, assigned on first check-in). 1 = PRESENT/LATE.
+# A 1,000-student session is 125 bytes; BITCOUNT gives the live count.
+# reconcile_presence() periodically squares them with the Attendance table.
+ATTENDING_STATUSES = (Attendance.Status.PRESENT, Attendance.Status.LATE)
+PRESENCE_TTL = 3600 * 24 * 7
+PRESENCE_SESSIONS = 'presence:sessions' # "course_id:date" of sessions with a bitmap
+PRESENCE_NEXT_INDEX = '__next__'
+
+# KEYS: index hash, bitmap, sessions set. ARGV: student_id, bit, ttl, "course_id:date"
+# Assigns the student's index if needed and sets/clears the bit, atomically.
+MARK_PRESENCE_LUA = """
+local index = redis.call('HGET', KEYS[1], ARGV[1])
+if not index then
+    if ARGV[2] == '0' then
+        return -1 -- never marked, nothing to clear
+    end
+    index = redis.call('HINCRBY', KEYS[1], '__next__', 1) - 1
+    redis.call('HSET', KEYS[1], ARGV[1], index)
+end
+redis.call('SETBIT', KEYS[2], index, ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('SADD', KEYS[3], ARGV[4])
+return tonumber(index)
+"""
+
+mark_presence_script = r.register_script(MARK_PRESENCE_LUA)
+
+def presence_index_key(course_id):
+    return f"presence_index:{course_id}"
+
+def presence_key(course_id, date):
+    return f"presence:{course_id}:{date}"
+
+def presence_script_args(course_id, date, student_id, status):
+    """
+    (keys, args) for MARK_PRESENCE_LUA.
+    """
+    keys = [presence_index_key(course_id), presence_key(course_id, date), PRESENCE_SESSIONS]
+    args = [int(student_id), int(status in ATTENDING_STATUSES), PRESENCE_TTL, f"{course_id}:{date}"]
+    return keys, args
+
+def record_attendance_changes(course_id, date, changes, pipe=None):
+    """
+    For {student_id: status} changes of a session: updates the presence bitmap
+    and publishes them to the live roster.
+    Pass a pipeline to batch it with other commands.
+    """
+    if not changes:
+        return
+    writer = pipe or r.pipeline(transaction=False)
+    for student_id, status in changes.items():
+        keys, args = presence_script_args(course_id, date, student_id, status)
+        mark_presence_script(keys=keys, args=args, client=writer)
+    writer.publish(events_channel(course_id, date), _events_message(changes))
+    if pipe is None:
+        writer.execute()
+
+def _present_from(bitmap, index):
+    """
+    Student ids whose bit is set, from a GET of the bitmap and HGETALL of the index.
+    """
+    if not bitmap:
+        return set()
+    bits = set(np.flatnonzero(np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8))).tolist())
+    return {
+        int(student_id) for student_id, position in index.items()
+        if student_id != PRESENCE_NEXT_INDEX.encode('utf-8') and int(position) in bits
+    }
+
+def get_present_students(course_id, date):
+    """
+    Set of student ids present (or late) in a session, from Redis alone.
+    """
+    with r.pipeline(transaction=False) as pipe:
+        pipe.get(presence_key(course_id, date))
+        pipe.hgetall(presence_index_key(course_id))
+        bitmap, index = pipe.execute()
+    return _present_from(bitmap, index)
+
+def presence_count(course_id, date):
+    return r.bitcount(presence_key(course_id, date))
+
+# Enrollment sets: course_students:{id} holds the active student ids of a
+# course, kept in sync with Enrollment by attendance.signals, so check-ins
+# confirm enrollment with SMISMEMBER in their existing round-trip.
+# Member 0 marks a fully loaded set (also for a course with no students);
+# without it the set is (re)loaded from the DB. Check-ins only load sets for
+# courses with an active session, so made-up course ids create no keys.
+ENROLLMENT_LOADED = 0
+
+def enrollment_key(course_id):
+    return f"course_students:{course_id}"
+
+def enrollment_version_key(course_id):
+    # Bumped with every signal-driven SADD/SREM
+    return f"course_students_version:{course_id}"
+
+# KEYS: enrollment set, version. ARGV: version read before the DB snapshot, members...
+# Replaces the set only if no signal changed it since the snapshot was taken;
+# otherwise it is left alone (without the marker it is simply reloaded later).
+REPLACE_ENROLLMENT_LUA = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 2, #ARGV, 1000 do
+    redis.call('SADD', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+return 1
+"""
+
+replace_enrollment_script = r.register_script(REPLACE_ENROLLMENT_LUA)
+
+def load_enrollment_sets(course_ids, pipe=None):
+    """
+    Rebuilds the enrollment sets of the given courses from one Enrollment query
+    (plus one MGET of their versions beforehand).
+    Pass a pipeline to batch the writes. Returns {course_id: set(student_ids)}.
+    """
+    from courses.models import Enrollment
+    students = {int(course_id): set() for course_id in course_ids}
+    if not students:
+        return students
+    # Read before the snapshot so a change committed in between is detected
+    versions = r.mget([enrollment_version_key(course_id) for course_id in students])
+    for course_id, student_id in Enrollment.objects.filter(
+        course_id__in=students, is_active=True
+    ).values_list('course_id', 'student_id'):
+        students[course_id].add(student_id)
+
+    writer = pipe or r.pipeline()
+    for (course_id, student_ids), version in zip(students.items(), versions):
+        # Replace the set wholesale so dropped students disappear
+        replace_enrollment_script(
+            keys=[enrollment_key(course_id), enrollment_version_key(course_id)],
+            args=[int(version or 0), ENROLLMENT_LOADED, *student_ids],
+            client=writer
+        )
+    if pipe is None:
+        writer.execute()
+    return students
+
+def update_enrollment_set(course_id, student_id, active):
+    with r.pipeline() as pipe:
+        if active:
+            pipe.sadd(enrollment_key(course_id), student_id)
+        else:
+            pipe.srem(enrollment_key(course_id), student_id)
+        pipe.incr(enrollment_version_key(course_id))
+        pipe.execute()
+
+def is_enrolled(course_id, student_id, flags):
+    """
+    flags: SMISMEMBER(enrollment_key, [student_id, ENROLLMENT_LOADED]) reply.
+    """
+    member, loaded = flags
+    if loaded:
+        return bool(member)
+    return student_id in load_enrollment_sets([course_id])[int(course_id)]
+
+def check_enrollments(pairs):
+    """
+    is_enrolled for many (course_id, student_id) pairs in one round-trip.
+    """
+    with r.pipeline(transaction=False) as pipe:
+        for course_id, student_id in pairs:
+            pipe.smismember(enrollment_key(course_id), [student_id, ENROLLMENT_LOADED])
+        replies = pipe.execute()
+
+    unloaded = {course_id for (course_id, _), (_, loaded) in zip(pairs, replies) if not loaded}
+    students = load_enrollment_sets(unloaded) if unloaded else {}
+    return [
+        bool(member) if loaded else student_id in students[int(course_id)]
+        for (course_id, student_id), (member, loaded) in zip(pairs, replies)
+    ]
+
+# Attendance summary: per-(student, course) counts in AttendanceSummary.
+# Single check-ins add one to a counter; batch writes recount only the
+# (student, course) pairs they touched.
+SUMMARY_FIELDS = {
+    Attendance.Status.PRESENT: 'present',
+    Attendance.Status.LATE: 'late',
+    Attendance.Status.ABSENT: 'absent',
+}
+
+def refresh_attendance_summaries(pairs):
+    """
+    Recounts the summaries of the given (student_id, course_id) pairs:
+    one grouped COUNT over their records and one upsert.
+    """
+    pairs = {(int(student_id), int(course_id)) for student_id, course_id in pairs}
+    if not pairs:
+        return
+    counts = Attendance.objects.filter(
+        student_id__in={student_id for student_id, _ in pairs},
+        course_id__in={course_id for _, course_id in pairs}
+    ).values('student_id', 'course_id').annotate(**{
+        field: Count('id', filter=Q(status=value)) for value, field in SUMMARY_FIELDS.items()
+    })
+    found = {(row['student_id'], row['course_id']): row for row in counts}
+
+    AttendanceSummary.objects.bulk_create([
+        AttendanceSummary(
+            student_id=student_id,
+            course_id=course_id,
+            **{field: found.get((student_id, course_id), {}).get(field, 0) for field in SUMMARY_FIELDS.values()}
+        )
+        for student_id, course_id in pairs
+    ], update_conflicts=True, unique_fields=['student', 'course'],
+       update_fields=[*SUMMARY_FIELDS.values(), 'updated_at'])
+
+def add_to_summary(student_id, course_id, status):
+    """
+    Counts one new record: a single UPDATE, or a recount for a first record.
+    """
+    field = SUMMARY_FIELDS[status]
+    updated = AttendanceSummary.objects.filter(student_id=student_id, course_id=course_id).update(
+        **{field: F(field) + 1}, updated_at=timezone.now()
+    )
+    if not updated:
+        refresh_attendance_summaries([(student_id, course_id)])
+
+def verify_attendance(student, course_id, code, lat, lon):
+    """
+    Verifies attendance based on TOTP code and Geofencing (course radius).
+    Reads in one Redis round-trip: session state (unless locally cached),
+    enrollment and today's claim. On a cold cache the course location and
+    enrollment set may be loaded from the DB first. The first success of the
+    day then costs two more round-trips, the SET NX claim and the presence
+    update/roster publish, around one transaction writing the record and its
+    summary (or, in write-behind mode, one queueing pipeline instead of both).
+    Repeated check-ins are answered from the claim without touching the DB.
+    """
+    today = session_date()
+    claim = claim_key(course_id, student.id, today)
+    state = cached_session(course_id)
+    with r.pipeline(transaction=False) as pipe:
+        if state is None:
+            pipe.hgetall(session_key(course_id))
+        pipe.smismember(enrollment_key(course_id), [student.id, ENROLLMENT_LOADED])
+        pipe.get(claim)
+        results = pipe.execute()
+
+    claimed = results[-1]
+    if claimed:
+        return _claimed_result(claimed)
+
+    if state is None:
+        state = _load_session(course_id, results[0])
+    # Before the enrollment check, which may load the set from the DB
+    if state is None:
+        return False, "Attendance session not active."
+
+    if not is_enrolled(course_id, student.id, results[-2]):
+        return False, "You are not enrolled in this course."
+
+    success, message = evaluate_check_in(state, course_id, code, lat, lon)
+    if not success:
+        return False, message
+
+    status = Attendance.Status.PRESENT
+    if not r.set(claim, status, nx=True, exat=_end_of_day(today)):
+        # A concurrent request (double tap) won the claim
+        return _claimed_result(r.get(claim) or status.encode('utf-8'))
+
+    if settings.ATTENDANCE_WRITE_BEHIND:
+        # Return as soon as the check-in is queued; a Celery worker persists it
+        try:
+            enqueue_check_in(student.id, course_id, today, status)
+        except Exception:
+            # Nothing was queued: let the student retry
+            r.delete(claim)
+            raise
+        return True, message
+
+    # Mark Attendance (course_id is enough for the FK, no Course fetch)
     try:
-        course = Course.objects.get(id=course_id)
-        if course.latitude and course.longitude:
-            # Store as hash or simple string. JSON is easy.
-            import json
-            data = {
-                'lat': course.latitude,
-                'lon': course.longitude,
-                'radius': course.allowed_radius
-            }
-            r.setex(f"course_loc:{course_id}", 3600, json.dumps(data))
-    except Course.DoesNotExist:
-        pass
+        with transaction.atomic():
+            Attendance.objects.create(
+                student=student,
+                course_id=course_id,
+                date=today,
+                status=status
+            )
+            add_to_summary(student.id, course_id, status)
+    except IntegrityError:
+        # A record already exists (e.g. set manually by the professor)
+        r.set(claim, CLAIM_ALREADY_RECORDED, exat=_end_of_day(today))
+        return False, "Attendance already recorded for today."
+    except Exception:
+        r.delete(claim)
+        raise
 
-def get_course_location(course_id):
+    record_attendance_changes(course_id, today, {student.id: status})
+    return True, message
+
+def verify_bulk_attendance(rows):
     """
-    Returns (lat, lon, radius).
-    Tries Redis first, then DB.
-    """
-    import json
-    # 1. Try Redis
-    data = r.get(f"course_loc:{course_id}")
-    if data:
-        d = json.loads(data)
-        return d['lat'], d['lon'], d['radius']
-    
-    # 2. Fallback to DB
-    from courses.models import Course
+    Verifies a batch of kiosk/offline check-ins.
+    rows: dicts with student_id, course_id, code, timestamp (aware datetime), lat, lon.
+    TOTP is checked at each row's recorded timestamp, every geofence distance
+    comes from one vectorized haversine pass, enrollment is checked and duplicate
+    claims are taken in one pipeline each, existing records are found with one
+    query, and accepted rows are persisted with one bulk insert. A session
+    closed since is still open for scans recorded before it closed, and such
+    a scan replaces the ABSENT written at close-out.
+    Returns a list of (success, message), one per row.
+    """
+    results = [None] * len(rows)
+    states = get_course_sessions({row['course_id'] for row in rows})
+    latest = timezone.now() + timedelta(seconds=30)
+
+    # 1. Session and TOTP at the recorded time
+    candidates = []
+    for i, row in enumerate(rows):
+        if row['timestamp'] > latest:
+            results[i] = (False, "Timestamp is in the future.")
+            continue
+        # Allow one interval of drift between the QR display and the scanner clock
+        success, message = check_session_code(
+            states.get(row['course_id']), row['course_id'], row['code'],
+            for_time=row['timestamp'], valid_window=1
+        )
+        if success:
+            candidates.append(i)
+        else:
+            results[i] = (False, message)
+
+    if not candidates:
+        return results
+
+    # 2. Geofencing for all candidates at once
+    course_states = [states[rows[i]['course_id']] for i in candidates]
+    student_locs = np.array([(rows[i]['lat'], rows[i]['lon']) for i in candidates], dtype=float)
+    course_locs = np.array([(float(st['lat']), float(st['lon'])) for st in course_states], dtype=float)
+    radii = np.array([int(st.get('radius') or DEFAULT_RADIUS) for st in course_states])
+    distances = haversine_vector(student_locs, course_locs, Unit.METERS)
+
+    inside = []
+    for i, distance, radius in zip(candidates, distances, radii):
+        if distance > radius:
+            results[i] = (False, _location_failed(distance, radius))
+        else:
+            inside.append(i)
+
+    if not inside:
+        return results
+
+    # 3. Enrollment, all rows in one round-trip
+    enrolled = check_enrollments([(rows[i]['course_id'], rows[i]['student_id']) for i in inside])
+    for i, ok in zip(inside, enrolled):
+        if not ok:
+            results[i] = (False, "Student is not enrolled in this course.")
+    inside = [i for i, ok in zip(inside, enrolled) if ok]
+    if not inside:
+        return results
+
+    # 4. Duplicate claims (also covers repeats within the batch)
+    status = Attendance.Status.PRESENT
+    dates = {i: session_date(rows[i]['timestamp']) for i in inside}
+    with r.pipeline(transaction=False) as pipe:
+        for i in inside:
+            key = claim_key(rows[i]['course_id'], rows[i]['student_id'], dates[i])
+            pipe.set(key, status, nx=True, exat=_claim_expiry(dates[i]))
+        claimed = pipe.execute()
+
+    accepted = []
+    for i, won in zip(inside, claimed):
+        if won:
+            accepted.append(i)
+        else:
+            results[i] = (True, "Already checked in.")
+    if not accepted:
+        return results
+
+    # 5. Rows with a record already (e.g. set by the professor) keep it, in one
+    # query. An ABSENT is replaced by a scan from before the session closed:
+    # that is what the close-out (mark_absentees) wrote for a phone not synced yet.
+    def record_key(i):
+        return rows[i]['student_id'], rows[i]['course_id'], dates[i]
+    keys = {record_key(i) for i in accepted}
+    existing = {
+        (student_id, course_id, date): record_status
+        for student_id, course_id, date, record_status in Attendance.objects.filter(
+            student_id__in={student_id for student_id, _, _ in keys},
+            course_id__in={course_id for _, course_id, _ in keys},
+            date__in={date for _, _, date in keys}
+        ).values_list('student_id', 'course_id', 'date', 'status')
+        if (student_id, course_id, date) in keys
+    }
+    replaced = [
+        i for i in accepted
+        if existing.get(record_key(i)) == Attendance.Status.ABSENT
+        and _was_open_at(states[rows[i]['course_id']], rows[i]['timestamp'])
+    ]
+    kept = [i for i in accepted if record_key(i) in existing and i not in replaced]
+    if kept:
+        with r.pipeline(transaction=False) as pipe:
+            for i in kept:
+                key = claim_key(rows[i]['course_id'], rows[i]['student_id'], dates[i])
+                pipe.set(key, CLAIM_ALREADY_RECORDED, exat=_claim_expiry(dates[i]))
+                results[i] = (False, "Attendance already recorded.")
+            pipe.execute()
+        accepted = [i for i in accepted if i not in kept]
+    for i in accepted:
+        results[i] = (True, "Attendance valid.")
+    if not accepted:
+        return results
+
+    # 6. One bulk insert for the new records, one UPDATE for the replaced absences
+    with transaction.atomic():
+        Attendance.objects.bulk_create([
+            Attendance(
+                student_id=rows[i]['student_id'],
+                course_id=rows[i]['course_id'],
+                date=dates[i],
+                status=status
+            )
+            for i in accepted if i not in replaced
+        ], ignore_conflicts=True)
+        if replaced:
+            absences = Q()
+            for i in replaced:
+                absences |= Q(student_id=rows[i]['student_id'], course_id=rows[i]['course_id'], date=dates[i])
+            Attendance.objects.filter(absences, status=Attendance.Status.ABSENT).update(status=status)
+        refresh_attendance_summaries((rows[i]['student_id'], rows[i]['course_id']) for i in accepted)
+
+    changes = defaultdict(dict)
+    for i in accepted:
+        changes[(rows[i]['course_id'], dates[i])][rows[i]['student_id']] = status
+    with r.pipeline(transaction=False) as pipe:
+        for (course_id, date), session_changes in changes.items():
+            record_attendance_changes(course_id, date, session_changes, pipe=pipe)
+        pipe.execute()
+
+    return results
+
+# Write-behind ingestion:
+# accepted check-ins are appended to a Redis stream and mirrored in a
+# per-session "pending" hash until a worker bulk-inserts them.
+CHECKIN_STREAM = 'attendance:checkins'
+PENDING_TTL = 3600 * 24 * 2
+
+def pending_key(course_id, date):
+    return f"attendance_pending:{course_id}:{date}"
+
+def enqueue_check_in(student_id, course_id, date, status):
+    """
+    Queues (and announces) an accepted check-in in one MULTI/EXEC round-trip.
+    """
+    key = pending_key(course_id, date)
+    with r.pipeline() as pipe:
+        pipe.xadd(CHECKIN_STREAM, {
+            'student_id': student_id,
+            'course_id': course_id,
+            'date': str(date),
+            'status': status
+        })
+        pipe.hset(key, student_id, status)
+        pipe.expire(key, PENDING_TTL)
+        record_attendance_changes(course_id, date, {student_id: status}, pipe=pipe)
+        pipe.execute()
+
+def get_pending_check_ins(course_id, date):
+    """
+    Returns {student_id: status} for check-ins accepted but not yet persisted.
+    """
+    return {int(k): v for k, v in _decode(r.hgetall(pending_key(course_id, date))).items()}
+
+def flush_pending_check_ins(batch_size=None):
+    """
+    Drains the check-in stream into Attendance with batched
+    bulk_create(ignore_conflicts=True). Returns the number of entries drained.
+    A Redis lock keeps concurrent flushers from inserting the same batch.
+    """
+    batch_size = batch_size or settings.ATTENDANCE_FLUSH_BATCH_SIZE
+    lock = r.lock(f"{CHECKIN_STREAM}:flush", timeout=60)
+    if not lock.acquire(blocking=False):
+        return 0
+
+    total = 0
     try:
-        course = Course.objects.get(id=course_id)
-        if course.latitude and course.longitude:
-            # Cache it now for future
-            cache_course_location(course_id)
-            return course.latitude, course.longitude, course.allowed_radius
-    except Course.DoesNotExist:
-        pass
-        
-    return None, None, 50
+        while True:
+            entries = r.xrange(CHECKIN_STREAM, count=batch_size)
+            if not entries:
+                break
+
+            rows = []
+            flushed = defaultdict(list)
+            for _, fields in entries:
+                entry = _decode(fields)
+                rows.append(Attendance(
+                    student_id=int(entry['student_id']),
+                    course_id=int(entry['course_id']),
+                    date=entry['date'],
+                    status=entry['status']
+                ))
+                flushed[pending_key(entry['course_id'], entry['date'])].append(entry['student_id'])
+
+            Attendance.objects.bulk_create(rows, ignore_conflicts=True)
+            refresh_attendance_summaries((row.student_id, row.course_id) for row in rows)
+
+            # Only forget entries once they are safely in the DB
+            with r.pipeline() as pipe:
+                pipe.xdel(CHECKIN_STREAM, *[entry_id for entry_id, _ in entries])
+                for key, student_ids in flushed.items():
+                    pipe.hdel(key, *student_ids)
+                pipe.execute()
+
+            total += len(entries)
+            if len(entries) < batch_size:
+                break
+            lock.reacquire()
+    finally:
+        lock.release()
+    return total
+
+def get_attendance_sheet(course, date):
+    """
+    Roster of active enrollments with each student's status for a date
+    ("NONE" if no record), including check-ins not yet persisted.
+    """
+    from courses.models import Enrollment
+    # 1. Get all enrolled students
+    enrollments = Enrollment.objects.filter(course=course, is_active=True).select_related('student')
+
+    # 2. Get existing attendance records for this date
+    attendance_map = {a.student_id: a for a in Attendance.objects.filter(course=course, date=date)}
+    # Presence bitmap also covers check-ins not yet persisted (write-behind mode)
+    present = get_present_students(course.id, date)
+
+    # 3. Merge data
+    data = []
+    for enrollment in enrollments:
+        student = enrollment.student
+        record = attendance_map.get(student.id)
+        data.append({
+            "student_id": student.id,
+            "student_name": student.username, # Should use full name if available
+            "status": record.status if record else (Attendance.Status.PRESENT if student.id in present else "NONE"),
+            "attendance_id": record.id if record else None
+        })
+    return data
+
+def mark_absentees(course_id, date):
+    """
+    Marks every actively enrolled student without a record for the date as
+    ABSENT, set-based: one SELECT of the missing students, one bulk INSERT and
+    one SELECT of what was inserted. Existing PRESENT/LATE records are never
+    overwritten. Returns the count.
+    """
+    from courses.models import Enrollment
+    if settings.ATTENDANCE_WRITE_BEHIND:
+        # Queued check-ins must land first or they would lose to the ABSENT rows
+        flush_pending_check_ins()
+    pending = get_pending_check_ins(course_id, date)
+
+    missing = Enrollment.objects.filter(course_id=course_id, is_active=True).exclude(
+        student_id__in=Attendance.objects.filter(course_id=course_id, date=date).values('student_id')
+    ).values_list('student_id', flat=True)
+    student_ids = [student_id for student_id in missing if student_id not in pending]
+
+    if not student_ids:
+        return 0
+
+    # ignore_conflicts: a check-in racing this insert keeps its record
+    Attendance.objects.bulk_create([
+        Attendance(student_id=student_id, course_id=course_id, date=date, status=Attendance.Status.ABSENT)
+        for student_id in student_ids
+    ], ignore_conflicts=True)
+    # Only the rows really inserted are announced (and bits cleared)
+    inserted = list(Attendance.objects.filter(
+        course_id=course_id, date=date, student_id__in=student_ids, status=Attendance.Status.ABSENT
+    ).values_list('student_id', flat=True))
+    refresh_attendance_summaries((student_id, course_id) for student_id in inserted)
+    record_attendance_changes(course_id, date, {student_id: Attendance.Status.ABSENT for student_id in inserted})
+    return len(inserted)
+
+def closeout_key(schedule_id, date):
+    return f"session_closeout:{schedule_id}:{date}"
+
+def close_ended_sessions(now=None):
+    """
+    Closes the session and marks absentees for every class whose scheduled
+    end_time has passed today and whose session was opened today (holidays
+    and cancelled classes are left alone). Each schedule slot is closed out
+    once per day. Returns the number of slots closed out.
+    """
+    from courses.models import CourseSchedule
+    now = now or local_now()
+    today = session_date(now)
+    schedules = list(CourseSchedule.objects.filter(
+        day_of_week=today.weekday(),
+        end_time__lte=now.time(),
+        course__is_active=True
+    ).values_list('id', 'course_id'))
+    if not schedules:
+        return 0
+    opened = r.mget([opened_key(course_id, today) for _, course_id in schedules])
+
+    closed = 0
+    for (schedule_id, course_id), was_opened in zip(schedules, opened):
+        if not was_opened:
+            continue
+        # Claim the slot so overlapping beat runs/workers do not repeat it
+        if not r.set(closeout_key(schedule_id, today), 1, nx=True, exat=_end_of_day(today)):
+            continue
+        try:
+            close_course_session(course_id)
+            count = mark_absentees(course_id, today)
+        except Exception:
+            r.delete(closeout_key(schedule_id, today))
+            raise
+        logger.info("Closed out course %s (schedule %s): %d absent", course_id, schedule_id, count)
+        closed += 1
+    return closed
+
+# Pre-warming: shortly before each scheduled class, load what the check-in
+# burst reads (location, enrollment set, session secret) into Redis.
+def prewarm_key(schedule_id, date):
+    return f"session_prewarm:{schedule_id}:{date}"
+
+def prewarm_course_sessions(course_ids):
+    """
+    Loads location, active enrollment set and session secret for the courses:
+    two DB queries and two Redis round-trips (enrollment versions, then the
+    writes). Sessions are not opened; the professor still does that by showing
+    the QR code.
+    """
+    from courses.models import Course
+    courses = Course.objects.filter(id__in=course_ids).only('latitude', 'longitude', 'allowed_radius')
+
+    with r.pipeline() as pipe:
+        load_enrollment_sets(course_ids, pipe=pipe)
+        for course in courses:
+            key = session_key(course.id)
+            has_location = course.latitude is not None and course.longitude is not None
+            pipe.hset(key, mapping={
+                'lat': course.latitude if has_location else '',
+                'lon': course.longitude if has_location else '',
+                'radius': course.allowed_radius
+            })
+            if not _signed_mode():
+                pipe.hsetnx(key, 'secret', pyotp.random_base32())
+            pipe.expire(key, SESSION_TTL, nx=True)
+            pipe.publish(SESSION_INVALIDATION_CHANNEL, course.id)
+        pipe.execute()
+    for course in courses:
+        session_cache.invalidate(course.id)
+    return len(courses)
+
+def prewarm_upcoming_classes(now=None):
+    """
+    Pre-warms every course whose class starts within the next
+    ATTENDANCE_PREWARM_MINUTES. Each schedule slot is warmed once per day.
+    Returns the number of courses warmed.
+    """
+    from courses.models import CourseSchedule
+    now = now or local_now()
+    today = session_date(now)
+    window_end = min(now + timedelta(minutes=settings.ATTENDANCE_PREWARM_MINUTES),
+                     datetime.combine(today, time.max))
+    schedules = list(CourseSchedule.objects.filter(
+        day_of_week=today.weekday(),
+        start_time__gte=now.time(),
+        start_time__lte=window_end.time(),
+        course__is_active=True
+    ).values_list('id', 'course_id'))
+    if not schedules:
+        return 0
+
+    with r.pipeline() as pipe:
+        for schedule_id, _ in schedules:
+            pipe.set(prewarm_key(schedule_id, today), 1, nx=True, exat=_end_of_day(today))
+        claimed = pipe.execute()
+
+    course_ids = {course_id for (_, course_id), won in zip(schedules, claimed) if won}
+    if not course_ids:
+        return 0
+    warmed = prewarm_course_sessions(course_ids)
+    logger.info("Pre-warmed %d courses before class", warmed)
+    return warmed
+
+def bulk_update_statuses(course_id, rows):
+    """
+    Applies professor edits [{student_id, date, status}] for one course:
+    enrollment checked in one query, then one upsert in one transaction.
+    Returns a list of (success, message) in the same order as rows.
+    """
+    from courses.models import Enrollment
+    enrolled = set(Enrollment.objects.filter(
+        course_id=course_id, is_active=True, student_id__in={row['student_id'] for row in rows}
+    ).values_list('student_id', flat=True))
+
+    results = [None] * len(rows)
+    # One record per (student, date); a later row for the same record wins
+    changes = {}
+    for i, row in enumerate(rows):
+        if row['student_id'] not in enrolled:
+            results[i] = (False, "Student is not enrolled in this course")
+            continue
+        changes[(row['student_id'], row['date'])] = row['status']
+        results[i] = (True, "Status updated")
+
+    with transaction.atomic():
+        Attendance.objects.bulk_create([
+            Attendance(student_id=student_id, course_id=course_id, date=date, status=new_status)
+            for (student_id, date), new_status in changes.items()
+        ], update_conflicts=True, unique_fields=['student', 'course', 'date'], update_fields=['status'])
+        refresh_attendance_summaries((student_id, course_id) for student_id, _ in changes)
+
+    by_date = defaultdict(dict)
+    for (student_id, date), new_status in changes.items():
+        by_date[date][student_id] = new_status
+    with r.pipeline(transaction=False) as pipe:
+        for date, date_changes in by_date.items():
+            record_attendance_changes(course_id, date, date_changes, pipe=pipe)
+        pipe.execute()
+    return results
+
+# One character per status in the attendance matrix; no record is "-"
+MATRIX_CODES = {
+    Attendance.Status.PRESENT: 'P',
+    Attendance.Status.LATE: 'L',
+    Attendance.Status.ABSENT: 'A',
+}
+MATRIX_EMPTY = '-'
+
+def get_attendance_matrix(course, start=None, end=None):
+    """
+    Students x session dates for a course, from one query over Attendance
+    (plus one for the roster). Encoded compactly: "rows"[i][j] is the status
+    code of students[i] on dates[j].
+    """
+    from courses.models import Enrollment
+    records = Attendance.objects.filter(course=course)
+    if start:
+        records = records.filter(date__gte=start)
+    if end:
+        records = records.filter(date__lte=end)
+    records = list(records.values_list('student_id', 'student__username', 'date', 'status'))
+
+    # Today's queued check-ins (write-behind mode) are part of the grid too
+    today = session_date()
+    if (not start or start <= today) and (not end or today <= end):
+        for student_id, pending_status in get_pending_check_ins(course.id, today).items():
+            records.append((student_id, None, today, pending_status))
+
+    # Current roster first, then students who only appear in past records
+    students = dict(Enrollment.objects.filter(course=course, is_active=True)
+                    .order_by('student__username').values_list('student_id', 'student__username'))
+    for student_id, username, _, _ in records:
+        if student_id not in students and username is not None:
+            students[student_id] = username
+
+    dates = sorted({date for _, _, date, _ in records})
+    student_index = {student_id: i for i, student_id in enumerate(students)}
+    date_index = {date: j for j, date in enumerate(dates)}
+    grid = [[MATRIX_EMPTY] * len(dates) for _ in students]
+    for student_id, _, date, record_status in records:
+        i = student_index.get(student_id)
+        if i is not None and grid[i][date_index[date]] == MATRIX_EMPTY:
+            grid[i][date_index[date]] = MATRIX_CODES.get(record_status, MATRIX_EMPTY)
+
+    return {
+        "codes": {code: value for value, code in MATRIX_CODES.items()},
+        "students": [{"id": student_id, "name": username} for student_id, username in students.items()],
+        "dates": [str(date) for date in dates],
+        "rows": [''.join(row) for row in grid]
+    }
+
+EXPORT_COLUMNS = [
+    ('student_id', 'int'),
+    ('student_name', 'string'),
+    ('course_id', 'int'),
+    ('course_code', 'string'),
+    ('date', 'date'),
+    ('status', 'string'),
+]
+
+def export_attendance_rows(filters):
+    """
+    Row tuples (EXPORT_COLUMNS) for an export, read through a server-side
+    cursor in chunks. filters: professor_id (None = all courses), course_id,
+    start, end (ISO dates) - plain values so Celery can carry them.
+    """
+    records = Attendance.objects.all()
+    if filters.get('professor_id') is not None:
+        records = records.filter(course__professor_id=filters['professor_id'])
+    if filters.get('course_id'):
+        records = records.filter(course_id=filters['course_id'])
+    if filters.get('start'):
+        records = records.filter(date__gte=filters['start'])
+    if filters.get('end'):
+        records = records.filter(date__lte=filters['end'])
+    return records.order_by('course_id', 'date', 'student_id').values_list(
+        'student_id', 'student__username', 'course_id', 'course__code', 'date', 'status'
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+def reconcile_presence():
+    """
+    Squares every live presence bitmap with the Attendance table:
+    a set bit without a record is persisted as PRESENT (a lost write),
+    otherwise the record wins and the bit is set/cleared to match it.
+    Bitmaps that expired are dropped from PRESENCE_SESSIONS.
+    Returns the number of records inserted.
+    """
+    if settings.ATTENDANCE_WRITE_BEHIND:
+        # Queued check-ins are not lost writes
+        flush_pending_check_ins()
+
+    inserted = 0
+    for session in r.smembers(PRESENCE_SESSIONS):
+        course_id, date = session.decode('utf-8').split(':', 1)
+        with r.pipeline(transaction=False) as pipe:
+            pipe.get(presence_key(course_id, date))
+            pipe.hgetall(presence_index_key(course_id))
+            bitmap, index = pipe.execute()
+        if bitmap is None:
+            r.srem(PRESENCE_SESSIONS, session)
+            continue
+
+        present = _present_from(bitmap, index)
+        records = dict(Attendance.objects.filter(course_id=course_id, date=date).values_list('student_id', 'status'))
+        missing = present - records.keys() - get_pending_check_ins(course_id, date).keys()
+        Attendance.objects.bulk_create([
+            Attendance(student_id=student_id, course_id=course_id, date=date, status=Attendance.Status.PRESENT)
+            for student_id in missing
+        ], ignore_conflicts=True)
+        refresh_attendance_summaries((student_id, course_id) for student_id in missing)
+        inserted += len(missing)
+
+        stale = {
+            student_id: record_status for student_id, record_status in records.items()
+            if (record_status in ATTENDING_STATUSES) != (student_id in present)
+        }
+        with r.pipeline(transaction=False) as pipe:
+            for student_id, record_status in stale.items():
+                keys, args = presence_script_args(course_id, date, student_id, record_status)
+                mark_presence_script(keys=keys, args=args, client=pipe)
+            pipe.execute()
+    if inserted:
+        logger.info("Presence reconciliation persisted %d missing check-ins", inserted)
+    return inserted
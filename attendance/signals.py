@@ -0,0 +1,30 @@
+import logging
+import redis
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from courses.models import Enrollment
+from .services import update_enrollment_set
+
+logger = logging.getLogger(__name__)
+
+# Keep the Redis enrollment sets in step with Enrollment. Soft deletes
+# (SoftDeleteModel.delete) arrive as saves with is_active=False.
+# Queryset .update()/bulk writes bypass signals; use rebuild_enrollment_sets.
+
+def _sync(course_id, student_id, active):
+    def apply():
+        try:
+            update_enrollment_set(course_id, student_id, active)
+        except redis.RedisError:
+            logger.warning("Could not sync enrollment set for course %s", course_id, exc_info=True)
+    # Only once the enrollment change is committed
+    transaction.on_commit(apply)
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_saved(sender, instance, **kwargs):
+    _sync(instance.course_id, instance.student_id, instance.is_active)
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    _sync(instance.course_id, instance.student_id, False)
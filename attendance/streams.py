@@ -0,0 +1,188 @@
+import asyncio
+import json
+import time
+import weakref
+from asgiref.sync import sync_to_async
+from .async_services import get_async_redis, aget_session_state
+from .services import (
+    qr_code_at, events_channel, get_attendance_sheet, SESSION_INVALIDATION_CHANNEL, ATTENDING_STATUSES,
+    _signed_mode
+)
+
+# Server-Sent Events helpers for the ASGI server.
+
+QR_INTERVAL = 30
+# Comment line sent when idle so proxies and clients keep the connection open
+KEEPALIVE_INTERVAL = 15
+
+# End of stream: the timer died (the client may reconnect) / the session is
+# closed (the client should stop)
+STREAM_CLOSED = object()
+SESSION_CLOSED = object()
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class QRBroadcaster:
+    """
+    One timer per course (per process) that computes the next QR code exactly
+    at each interval boundary and fans it out to every connected screen.
+    The timer only reads the session state, once per interval and on every
+    invalidation; opening is GenerateQRView's job, so a connected screen never
+    reopens a session, and a closed one ends the stream.
+    """
+    def __init__(self):
+        self._subscribers = {}
+        self._tasks = {}
+        self._current = {}
+        # course_id -> Event set when the course's session is invalidated
+        self._stale = {}
+        self._listener = None
+
+    async def subscribe(self, course_id):
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(course_id, set()).add(queue)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+        task = self._tasks.get(course_id)
+        if task is None or task.done():
+            self._stale[course_id] = asyncio.Event()
+            self._tasks[course_id] = asyncio.create_task(self._run(course_id))
+        else:
+            # Late joiners get the current code right away
+            queue.put_nowait(self._current.get(course_id))
+        return queue
+
+    def unsubscribe(self, course_id, queue):
+        subscribers = self._subscribers.get(course_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[course_id]
+
+    async def _listen(self):
+        # One subscription per process for all courses: a rotated secret or a
+        # closed/reopened session wakes that course's timer
+        pubsub = get_async_redis().pubsub()
+        try:
+            await pubsub.subscribe(SESSION_INVALIDATION_CHANNEL)
+            while self._subscribers:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_INTERVAL)
+                if message is not None:
+                    stale = self._stale.get(int(message['data']))
+                    if stale is not None:
+                        stale.set()
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+    async def _run(self, course_id):
+        stale = self._stale[course_id]
+        end = STREAM_CLOSED
+        try:
+            while self._subscribers.get(course_id):
+                stale.clear()
+                is_open, secret = await aget_session_state(course_id)
+                if not is_open or (secret is None and not _signed_mode()):
+                    # Closed (or expired): no code is valid any more
+                    end = SESSION_CLOSED
+                    break
+
+                now = time.time()
+                counter = int(now // QR_INTERVAL)
+                expires_at = (counter + 1) * QR_INTERVAL
+                message = {
+                    "code": qr_code_at(course_id, secret, now),
+                    "valid_for": round(expires_at - now),
+                    "expires_at": expires_at
+                }
+                self._current[course_id] = message
+                for queue in list(self._subscribers.get(course_id, ())):
+                    # Slow consumers only ever need the newest code
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(message)
+
+                # Until the next boundary, or earlier if the session changed
+                try:
+                    await asyncio.wait_for(stale.wait(), timeout=max(0, expires_at - time.time()))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._tasks.pop(course_id, None)
+            self._current.pop(course_id, None)
+            self._stale.pop(course_id, None)
+            # If the timer died (e.g. Redis error), EventSource reconnects;
+            # a closed session tells the screen to stop
+            for queue in self._subscribers.pop(course_id, ()):
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(end)
+
+# One broadcaster per event loop (tasks cannot cross loops)
+_broadcasters = weakref.WeakKeyDictionary()
+
+def get_qr_broadcaster():
+    loop = asyncio.get_running_loop()
+    broadcaster = _broadcasters.get(loop)
+    if broadcaster is None:
+        broadcaster = QRBroadcaster()
+        _broadcasters[loop] = broadcaster
+    return broadcaster
+
+async def qr_event_stream(course_id):
+    """
+    Async iterator of SSE messages with the rotating QR code for a course.
+    """
+    broadcaster = get_qr_broadcaster()
+    queue = await broadcaster.subscribe(course_id)
+    try:
+        while True:
+            message = await queue.get()
+            if message is SESSION_CLOSED:
+                yield sse_event('closed', {"course_id": course_id})
+                break
+            if message is STREAM_CLOSED:
+                break
+            if message is not None:
+                yield sse_event('code', message)
+    finally:
+        broadcaster.unsubscribe(course_id, queue)
+
+async def roster_event_stream(course, date):
+    """
+    Async iterator of SSE messages for a professor's live roster: the full
+    sheet once ("roster"), then one "update" per status change published by
+    the check-in paths, each with the running present/total counter.
+    """
+    pubsub = get_async_redis().pubsub()
+    # Subscribe before reading the sheet so no change falls in between
+    await pubsub.subscribe(events_channel(course.id, date))
+    try:
+        sheet = await sync_to_async(get_attendance_sheet)(course, date)
+        statuses = {row['student_id']: row['status'] for row in sheet}
+        present = sum(1 for value in statuses.values() if value in ATTENDING_STATUSES)
+        yield sse_event('roster', {"students": sheet, "present": present, "total": len(statuses)})
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+
+            for change in json.loads(message['data'])['changes']:
+                student_id, new_status = change['student_id'], change['status']
+                # Only enrolled students are on the sheet; repeats are no-ops
+                if student_id not in statuses or statuses[student_id] == new_status:
+                    continue
+                present += (new_status in ATTENDING_STATUSES) - (statuses[student_id] in ATTENDING_STATUSES)
+                statuses[student_id] = new_status
+                yield sse_event('update', {
+                    "student_id": student_id,
+                    "status": new_status,
+                    "present": present,
+                    "total": len(statuses)
+                })
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
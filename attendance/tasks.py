@@ -0,0 +1,42 @@
+from celery import shared_task
+from celery.signals import worker_shutdown
+from core.exports import run_parquet_export
+from .services import flush_pending_check_ins, close_ended_sessions, prewarm_upcoming_classes, reconcile_presence, export_attendance_rows, EXPORT_COLUMNS
+
+@shared_task(ignore_result=True)
+def flush_check_ins():
+    """
+    Periodic (beat) drain of write-behind check-ins into the DB.
+    """
+    return flush_pending_check_ins()
+
+@shared_task(ignore_result=True)
+def close_out_sessions():
+    """
+    Periodic (beat) close-out: ends sessions whose class is over and marks
+    the remaining enrolled students ABSENT.
+    """
+    return close_ended_sessions()
+
+@shared_task(ignore_result=True)
+def prewarm_classes():
+    """
+    Periodic (beat) pre-warming of Redis for classes about to start.
+    """
+    return prewarm_upcoming_classes()
+
+@shared_task(ignore_result=True)
+def reconcile_presence_bitmaps():
+    """
+    Periodic (beat) reconciliation of presence bitmaps with Attendance.
+    """
+    return reconcile_presence()
+
+@shared_task(ignore_result=True)
+def export_attendance_parquet(job_id, filters):
+    return run_parquet_export(job_id, EXPORT_COLUMNS, export_attendance_rows(filters))
+
+@worker_shutdown.connect
+def flush_check_ins_on_shutdown(**kwargs):
+    # Persist whatever is still queued before the worker goes away
+    flush_pending_check_ins()
@@ -0,0 +1,48 @@
+import base64
+import hashlib
+import hmac
+import time
+from django.conf import settings
+
+# Stateless QR tokens: HMAC(server key, "course_id:interval counter").
+# Any worker can verify them in CPU, without looking up a per-session secret.
+TOKEN_INTERVAL = 30
+TOKEN_LENGTH = 10
+
+def _counter(for_time=None):
+    if for_time is None:
+        timestamp = time.time()
+    elif hasattr(for_time, 'timestamp'):
+        timestamp = for_time.timestamp()
+    else:
+        timestamp = for_time
+    return int(timestamp // TOKEN_INTERVAL)
+
+def _sign(key, course_id, counter):
+    digest = hmac.new(key.encode('utf-8'), f"{course_id}:{counter}".encode('utf-8'), hashlib.sha256).digest()
+    return base64.b32encode(digest).decode('ascii')[:TOKEN_LENGTH]
+
+def generate_signed_token(course_id, for_time=None):
+    """
+    Returns the token for the current interval, signed with the newest key.
+    """
+    return _sign(settings.ATTENDANCE_SIGNING_KEYS[0], course_id, _counter(for_time))
+
+def verify_signed_token(course_id, token, for_time=None, skew=None):
+    """
+    Accepts tokens from any configured key (key rotation) and from up to
+    `skew` intervals before/after for_time (clock skew between screen and server).
+    """
+    if skew is None:
+        skew = settings.ATTENDANCE_TOKEN_SKEW
+    token = (token or '').upper()
+    if len(token) != TOKEN_LENGTH:
+        return False
+
+    counter = _counter(for_time)
+    valid = False
+    for key in settings.ATTENDANCE_SIGNING_KEYS:
+        for offset in range(-skew, skew + 1):
+            # No early exit so timing does not reveal which key/interval matched
+            valid |= hmac.compare_digest(_sign(key, course_id, counter + offset), token)
+    return valid
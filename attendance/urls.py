@@ -1,13 +1,19 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AttendanceViewSet, CheckInView, GenerateQRView, AttendanceStatsView
+from .views import AttendanceViewSet, CheckInView, BulkCheckInView, async_check_in, qr_stream, roster_stream, GenerateQRView, AttendanceStatsView, CourseAttendanceStatsView, SessionCacheStatsView
 
 router = DefaultRouter()
 router.register(r'attendance', AttendanceViewSet)
 
 urlpatterns = [
     path('attendance/check-in/', CheckInView.as_view(), name='check-in'),
+    path('attendance/check-in/bulk/', BulkCheckInView.as_view(), name='check-in-bulk'),
+    path('attendance/check-in/async/', async_check_in, name='check-in-async'),
     path('attendance/generate-qr/<int:course_id>/', GenerateQRView.as_view(), name='generate-qr'),
+    path('attendance/qr-stream/<int:course_id>/', qr_stream, name='qr-stream'),
+    path('attendance/roster-stream/', roster_stream, name='roster-stream'),
     path('attendance/stats/', AttendanceStatsView.as_view(), name='attendance-stats'),
+    path('attendance/stats/<int:course_id>/', CourseAttendanceStatsView.as_view(), name='course-attendance-stats'),
+    path('attendance/cache-stats/', SessionCacheStatsView.as_view(), name='attendance-cache-stats'),
     path('', include(router.urls)),
 ]
@@ -1,32 +1,75 @@
+import os
+import json
+import math
 from rest_framework import viewsets, views, status, permissions
 from rest_framework.response import Response
-from .models import Attendance
-from .serializers import AttendanceSerializer, AttendanceCheckInSerializer
-from .services import verify_attendance, generate_qr_token
+from rest_framework.exceptions import ValidationError
+from django.db.models import Sum
+from .models import Attendance, AttendanceSummary
+from .serializers import AttendanceSerializer, AttendanceCheckInSerializer, BulkCheckInItemSerializer, AttendanceStatusItemSerializer
+from .async_services import averify_attendance, get_async_redis
+from .streams import qr_event_stream, roster_event_stream
+from .tasks import export_attendance_parquet
+from .services import verify_attendance, verify_bulk_attendance, generate_qr_token, cache_course_location, get_attendance_sheet, record_attendance_changes, mark_absentees, bulk_update_statuses, get_attendance_matrix, refresh_attendance_summaries, export_attendance_rows, EXPORT_COLUMNS, get_present_students, presence_count, session_cache, session_date
 from courses.models import Course
-from core.permissions import IsStudent, IsProfessor
+from core.permissions import IsStudent, IsProfessor, IsAdmin
+from core.pagination import AttendancePagination
+from core.exports import csv_response, start_parquet_export, export_job_response, export_filters, export_filename
+from core.ratelimit import CheckInThrottle, GenerateQRThrottle, SheetThrottle, build_buckets, aacquire
 from users.models import User
 from rest_framework.decorators import action
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 from datetime import date as date_obj
 
 class AttendanceViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AttendancePagination
+
+    def get_throttles(self):
+        if self.action in ('sheet', 'matrix', 'presence'):
+            return [SheetThrottle()]
+        return super().get_throttles()
 
     def get_queryset(self):
         user = self.request.user
         if user.is_student():
-            return Attendance.objects.filter(student=user)
+            queryset = Attendance.objects.filter(student=user)
         elif user.is_professor():
-            return Attendance.objects.filter(course__professor=user)
-        return Attendance.objects.none()
+            queryset = Attendance.objects.filter(course__professor=user)
+        else:
+            return Attendance.objects.none()
+
+        # ?course_id=1&start=2023-09-01&end=2023-12-20
+        params = self.request.query_params
+        if params.get('course_id'):
+            if not params['course_id'].isdigit():
+                raise ValidationError({"course_id": "Must be an integer."})
+            queryset = queryset.filter(course_id=params['course_id'])
+        for param, lookup in (('start', 'date__gte'), ('end', 'date__lte')):
+            if params.get(param):
+                try:
+                    queryset = queryset.filter(**{lookup: date_obj.fromisoformat(params[param])})
+                except ValueError:
+                    raise ValidationError({param: "Must be a date (YYYY-MM-DD)."})
+
+        # Student name joined in, not fetched per row
+        return queryset.select_related('student').only(
+            'id', 'student_id', 'course_id', 'date', 'status', 'created_at', 'student__username'
+        )
 
     @action(detail=False, methods=['get'])
     def sheet(self, request):
         # /api/attendance/sheet/?course_id=1&date=2023-10-27
         course_id = request.query_params.get('course_id')
-        date_str = request.query_params.get('date', str(date_obj.today()))
+        date_str = request.query_params.get('date', str(session_date()))
         
         if not course_id:
             return Response({"error": "course_id is required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -38,34 +81,78 @@ class AttendanceViewSet(viewsets.ReadOnlyModelViewSet):
         except Course.DoesNotExist:
              return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # 1. Get all enrolled students
-        from courses.models import Enrollment
-        enrollments = Enrollment.objects.filter(course=course, is_active=True).select_related('student')
-        
-        # 2. Get existing attendance records for this date
-        attendances = Attendance.objects.filter(course=course, date=date_str)
-        attendance_map = {a.student_id: a for a in attendances}
-        
-        # 3. Merge data
-        data = []
-        for enrollment in enrollments:
-            student = enrollment.student
-            record = attendance_map.get(student.id)
-            data.append({
-                "student_id": student.id,
-                "student_name": student.username, # Should use full name if available
-                "status": record.status if record else "NONE",
-                "attendance_id": record.id if record else None
-            })
-            
+        data = get_attendance_sheet(course, date_str)
         return Response(data)
 
+    @action(detail=False, methods=['get'])
+    def presence(self, request):
+        # /api/attendance/presence/?course_id=1&date=2023-10-27[&count=1]
+        # Who is present (or late) right now, from the session's presence bitmap only
+        course_id = request.query_params.get('course_id')
+        if not course_id:
+            return Response({"error": "course_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date = date_obj.fromisoformat(request.query_params.get('date', str(session_date())))
+        except ValueError:
+            return Response({"error": "date must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        course = Course.objects.filter(id=course_id).only('id', 'professor_id').first()
+        if course is None:
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not (request.user.is_admin() or course.professor_id == request.user.id):
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        if request.query_params.get('count'):
+            # Live counter polling: a single BITCOUNT
+            return Response({"course_id": course.id, "date": str(date), "present": presence_count(course.id, date)})
+        present = sorted(get_present_students(course.id, date))
+        return Response({"course_id": course.id, "date": str(date), "present": len(present), "student_ids": present})
+
+    @action(detail=False, methods=['get'])
+    def matrix(self, request):
+        # /api/attendance/matrix/?course_id=1&start=2023-09-01&end=2023-12-20
+        course_id = request.query_params.get('course_id')
+        if not course_id:
+            return Response({"error": "course_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = (
+                date_obj.fromisoformat(value) if value else None
+                for value in (request.query_params.get('start'), request.query_params.get('end'))
+            )
+        except ValueError:
+            return Response({"error": "start and end must be dates (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+
+        course = Course.objects.filter(id=course_id).first()
+        if course is None:
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not (request.user.is_admin() or course.professor_id == request.user.id):
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(get_attendance_matrix(course, start, end))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # /api/attendance/export/?course_id=1&start=2023-09-01&end=2023-12-20 (CSV, streamed)
+        filters, error = export_filters(request, date_range=True)
+        if error:
+            return error
+        return csv_response(export_filename('attendance', filters, 'csv', date_range=True), EXPORT_COLUMNS, export_attendance_rows(filters))
+
+    @action(detail=False, methods=['post'], url_path='export/parquet')
+    def export_parquet(self, request):
+        # Same filters as export; written by a Celery task, fetch it from download_url
+        filters, error = export_filters(request, date_range=True)
+        if error:
+            return error
+        job_id = start_parquet_export(export_attendance_parquet, request.user, export_filename('attendance', filters, 'parquet', date_range=True), filters)
+        return export_job_response(request, job_id)
+
     @action(detail=False, methods=['post'])
     def update_status(self, request):
         # { "student_id": 1, "course_id": 1, "date": "2023-10-27", "status": "PRESENT" }
         student_id = request.data.get('student_id')
         course_id = request.data.get('course_id')
-        date_str = request.data.get('date', str(date_obj.today()))
+        date_str = request.data.get('date', str(session_date()))
         new_status = request.data.get('status')
         
         if not all([student_id, course_id, new_status]):
@@ -84,39 +171,78 @@ class AttendanceViewSet(viewsets.ReadOnlyModelViewSet):
             date=date_str,
             defaults={'status': new_status}
         )
+        refresh_attendance_summaries([(student.id, course.id)])
+        record_attendance_changes(course.id, date_str, {student.id: attendance.status})
         
         return Response({"message": "Status updated", "status": attendance.status})
 
+    @action(detail=False, methods=['post'])
+    def bulk_update_status(self, request):
+        # { "course_id": 1, "updates": [{ "student_id": 1, "date": "2023-10-27", "status": "LATE" }, ...] }
+        course_id = request.data.get('course_id')
+        updates = request.data.get('updates')
+
+        if not course_id or not isinstance(updates, list) or not updates:
+            return Response({"error": "course_id and a non-empty updates list are required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(updates) > settings.ATTENDANCE_BULK_MAX_ROWS:
+            return Response({"error": f"At most {settings.ATTENDANCE_BULK_MAX_ROWS} updates per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        course = Course.objects.filter(id=course_id).only('id', 'professor_id').first()
+        if course is None:
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not (request.user.is_admin() or course.professor_id == request.user.id):
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        verdicts = [None] * len(updates)
+        rows, row_indexes = [], []
+        for i, item in enumerate(updates):
+            serializer = AttendanceStatusItemSerializer(data=item)
+            if not serializer.is_valid():
+                verdicts[i] = (False, serializer.errors)
+                continue
+            row = serializer.validated_data
+            row.setdefault('date', session_date())
+            rows.append(row)
+            row_indexes.append(i)
+
+        if rows:
+            for i, verdict in zip(row_indexes, bulk_update_statuses(course.id, rows)):
+                verdicts[i] = verdict
+
+        results = []
+        for i, (success, message) in enumerate(verdicts):
+            item = updates[i] if isinstance(updates[i], dict) else {}
+            results.append({
+                "index": i,
+                "student_id": item.get('student_id'),
+                "success": success,
+                "message" if success else "error": message
+            })
+
+        updated = sum(1 for success, _ in verdicts if success)
+        return Response({
+            "updated": updated,
+            "rejected": len(verdicts) - updated,
+            "results": results
+        })
+
     @action(detail=False, methods=['post'])
     def batch_absent(self, request):
         # Mark all students without a record as ABSENT
         course_id = request.data.get('course_id')
-        date_str = request.data.get('date', str(date_obj.today()))
+        date_str = request.data.get('date', str(session_date()))
         
         course = Course.objects.get(id=course_id)
         if request.user.is_professor() and course.professor != request.user:
             return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
             
-        from courses.models import Enrollment
-        enrollments = Enrollment.objects.filter(course=course, is_active=True)
-        
-        count = 0
-        for enrollment in enrollments:
-            student = enrollment.student
-            # Use get_or_create to avoid overwriting existing PRESENT/LATE
-            obj, created = Attendance.objects.get_or_create(
-                student=student,
-                course=course,
-                date=date_str,
-                defaults={'status': Attendance.Status.ABSENT}
-            )
-            if created:
-                count += 1
+        count = mark_absentees(course.id, date_str)
                 
         return Response({"message": f"{count} students marked as absent"})
 
 class CheckInView(views.APIView):
     permission_classes = [IsStudent]
+    throttle_classes = [CheckInThrottle]
     serializer_class = AttendanceCheckInSerializer
 
     def post(self, request):
@@ -127,20 +253,10 @@ class CheckInView(views.APIView):
             lat = serializer.validated_data['lat']
             lon = serializer.validated_data['lon']
             
-            try:
-                course = Course.objects.get(id=course_id)
-            except Course.DoesNotExist:
-                return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
-            
-            # Retrieve Course (DB lookup is needed for FK relation in Attendance)
-            # Optimization: Course location is fetched via Redis inside verify_attendance
-            try:
-                course = Course.objects.get(id=course_id)
-            except Course.DoesNotExist:
-                return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
-            
-            # Dynamic Verification
-            success, message = verify_attendance(request.user, course, code, lat, lon)
+            # No Course lookup: the session state (secret + location) is read in
+            # one Redis round-trip inside verify_attendance, and course_id is
+            # enough for the Attendance FK.
+            success, message = verify_attendance(request.user, course_id, code, lat, lon)
             
             if success:
                 return Response({"message": message}, status=status.HTTP_200_OK)
@@ -148,10 +264,214 @@ class CheckInView(views.APIView):
                 return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+async def _aauthenticate(request, allow_query_token=False):
+    """
+    JWT authentication for plain async views (DRF views are sync-only).
+    Streams may pass the access token as ?token= since EventSource cannot set headers.
+    Returns (user, error_response).
+    """
+    jwt_auth = JWTAuthentication()
+    raw_token = request.GET.get('token') if allow_query_token else None
+    try:
+        if raw_token:
+            user = await sync_to_async(jwt_auth.get_user)(jwt_auth.get_validated_token(raw_token))
+        else:
+            auth = await sync_to_async(jwt_auth.authenticate)(request)
+            if auth is None:
+                return None, JsonResponse({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+            user = auth[0]
+    except (InvalidToken, AuthenticationFailed) as e:
+        return None, JsonResponse({"detail": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    return user, None
+
+def _forbidden():
+    return JsonResponse({"detail": "You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN)
+
+def _event_stream_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Let nginx pass events through immediately
+    return response
+
+@csrf_exempt
+@require_POST
+async def async_check_in(request):
+    """
+    Async variant of CheckInView for the ASGI server (core.asgi).
+    Same request/response contract; waiting on Redis and the DB does not
+    hold a worker, so one process can serve a whole lecture-start burst.
+    """
+    user, error = await _aauthenticate(request)
+    if error:
+        return error
+    if not user.is_student():
+        return _forbidden()
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+
+    allowed, retry_after = await aacquire(
+        get_async_redis(), build_buckets('check_in', user.id, data.get('course_id') if isinstance(data, dict) else None)
+    )
+    if not allowed:
+        response = JsonResponse({"detail": "Request was throttled."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(math.ceil(retry_after))
+        return response
+
+    serializer = AttendanceCheckInSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    success, message = await averify_attendance(
+        user,
+        serializer.validated_data['course_id'],
+        serializer.validated_data['code'],
+        serializer.validated_data['lat'],
+        serializer.validated_data['lon']
+    )
+    if success:
+        return JsonResponse({"message": message}, status=status.HTTP_200_OK)
+    return JsonResponse({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+@require_GET
+async def qr_stream(request, course_id):
+    """
+    Server-Sent Events stream of the rotating QR code for a course session.
+    Replaces polling GenerateQRView: codes are pushed at each interval boundary
+    from one timer per course, shared by every connected professor screen.
+    The stream only reads the session (opened by POSTing to GenerateQRView)
+    and ends with a "closed" event once it is closed.
+    """
+    user, error = await _aauthenticate(request, allow_query_token=True)
+    if error:
+        return error
+    if not user.is_professor():
+        return _forbidden()
+
+    course = await Course.objects.filter(id=course_id, professor=user).afirst()
+    if course is None:
+        return JsonResponse({"error": "Course not found or permission denied"}, status=status.HTTP_404_NOT_FOUND)
+
+    return _event_stream_response(qr_event_stream(course_id))
+
+@require_GET
+async def roster_stream(request):
+    """
+    Server-Sent Events stream of a session's roster for the professor's screen.
+    /api/attendance/roster-stream/?course_id=1&date=2023-10-27
+    Sends the sheet once, then only the students whose status changed.
+    """
+    user, error = await _aauthenticate(request, allow_query_token=True)
+    if error:
+        return error
+    if not (user.is_professor() or user.is_admin()):
+        return _forbidden()
+
+    course_id = request.GET.get('course_id')
+    try:
+        date = date_obj.fromisoformat(request.GET.get('date', str(session_date())))
+    except ValueError:
+        return JsonResponse({"error": "Invalid date"}, status=status.HTTP_400_BAD_REQUEST)
+    if not course_id:
+        return JsonResponse({"error": "course_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    courses = Course.objects.filter(id=course_id)
+    if not user.is_admin():
+        courses = courses.filter(professor=user)
+    try:
+        course = await courses.afirst()
+    except ValueError:
+        course = None
+    if course is None:
+        return JsonResponse({"error": "Course not found or permission denied"}, status=status.HTTP_404_NOT_FOUND)
+
+    return _event_stream_response(roster_event_stream(course, date))
+
+class BulkCheckInView(views.APIView):
+    """
+    Bulk upload for classroom kiosks and phones that queued scans offline.
+    Body: [{"student_id", "course_id", "code", "timestamp", "lat", "lon"}, ...]
+    Returns a verdict per row.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"error": "Expected a non-empty list of check-ins"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.ATTENDANCE_BULK_MAX_ROWS:
+            return Response({"error": f"At most {settings.ATTENDANCE_BULK_MAX_ROWS} check-ins per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        verdicts = [None] * len(request.data)
+        rows, row_indexes = [], []
+        for i, item in enumerate(request.data):
+            serializer = BulkCheckInItemSerializer(data=item)
+            if not serializer.is_valid():
+                verdicts[i] = (False, serializer.errors)
+                continue
+            row = serializer.validated_data
+            if user.is_student():
+                # Students can only upload their own scans
+                if row.setdefault('student_id', user.id) != user.id:
+                    verdicts[i] = (False, "Permission denied")
+                    continue
+            elif 'student_id' not in row:
+                verdicts[i] = (False, {"student_id": ["This field is required."]})
+                continue
+            rows.append(row)
+            row_indexes.append(i)
+
+        # Kiosks (professors/admins) may only submit students for courses they run
+        if rows and not user.is_student():
+            allowed_courses = Course.objects.filter(id__in={row['course_id'] for row in rows})
+            if not user.is_admin():
+                allowed_courses = allowed_courses.filter(professor=user)
+            allowed_courses = set(allowed_courses.values_list('id', flat=True))
+            students = set(User.objects.filter(
+                id__in={row['student_id'] for row in rows}, role=User.Role.STUDENT
+            ).values_list('id', flat=True))
+
+            kept_rows, kept_indexes = [], []
+            for i, row in zip(row_indexes, rows):
+                if row['course_id'] not in allowed_courses:
+                    verdicts[i] = (False, "Course not found or permission denied")
+                elif row['student_id'] not in students:
+                    verdicts[i] = (False, "Student not found")
+                else:
+                    kept_rows.append(row)
+                    kept_indexes.append(i)
+            rows, row_indexes = kept_rows, kept_indexes
+
+        if rows:
+            for i, verdict in zip(row_indexes, verify_bulk_attendance(rows)):
+                verdicts[i] = verdict
+
+        results = []
+        for i, (success, message) in enumerate(verdicts):
+            item = request.data[i] if isinstance(request.data[i], dict) else {}
+            results.append({
+                "index": i,
+                "student_id": item.get('student_id', user.id if user.is_student() else None),
+                "course_id": item.get('course_id'),
+                "success": success,
+                "message" if success else "error": message
+            })
+
+        accepted = sum(1 for success, _ in verdicts if success)
+        return Response({
+            "accepted": accepted,
+            "rejected": len(verdicts) - accepted,
+            "results": results
+        }, status=status.HTTP_200_OK)
+
 class GenerateQRView(views.APIView):
     permission_classes = [IsProfessor]
+    throttle_classes = [GenerateQRThrottle]
     
-    def get(self, request, course_id):
+    def post(self, request, course_id):
+        # Opens (or reopens) the session; the QR stream only reads it
         # Check ownership
         try:
             course = Course.objects.get(id=course_id, professor=request.user)
@@ -162,30 +482,61 @@ class GenerateQRView(views.APIView):
         code, secret = generate_qr_token(course_id)
         
         # Cache Course Location for O(1) Access during class
-        from .services import cache_course_location
-        cache_course_location(course_id)
+        cache_course_location(course_id, course=course)
         
         return Response({"code": code, "secret": secret, "valid_for": "30s"})
 
+class SessionCacheStatsView(views.APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        # Counters are per worker process
+        return Response({"pid": os.getpid(), **session_cache.stats()})
+
+def _summary_stats(present, late, absent):
+    total = present + late + absent
+    return {
+        "total_classes": total,
+        "present_classes": present,
+        "late_classes": late,
+        "absent_classes": absent,
+        "attendance_rate": round(present / total * 100, 1) if total else 0.0
+    }
+
 class AttendanceStatsView(views.APIView):
     permission_classes = [IsStudent]
 
     def get(self, request):
-        user = request.user
-        # Total attendances (total classes held that expected this student)
-        # Note: This logic assumes an Attendance record is created for every class.
-        # If records are only created on check-in, we need a different approach (e.g. counting CourseSchedules vs Enrollment date).
-        # For simplicity in this beta, we count total records vs present records.
-        
-        total_records = Attendance.objects.filter(student=user).count()
-        present_count = Attendance.objects.filter(student=user, status=Attendance.Status.PRESENT).count()
-        
-        rate = 0.0
-        if total_records > 0:
-            rate = (present_count / total_records) * 100
-            
-        return Response({
-            "total_classes": total_records,
-            "present_classes": present_count,
-            "attendance_rate": round(rate, 1)
-        })
+        # Reads the maintained AttendanceSummary rows (one per course) instead of
+        # counting the whole history. Optional ?course_id= for one course.
+        summaries = AttendanceSummary.objects.filter(student=request.user)
+        course_id = request.query_params.get('course_id')
+        if course_id:
+            summaries = summaries.filter(course_id=course_id)
+        totals = summaries.aggregate(present=Sum('present'), late=Sum('late'), absent=Sum('absent'))
+        return Response(_summary_stats(*(totals[field] or 0 for field in ('present', 'late', 'absent'))))
+
+class CourseAttendanceStatsView(views.APIView):
+    """
+    Per-course attendance stats for the course's professor (or an admin):
+    course totals and one row per student, from AttendanceSummary.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, course_id):
+        course = Course.objects.filter(id=course_id).only('id', 'professor_id').first()
+        if course is None:
+            return Response({"error": "Course not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not (request.user.is_admin() or course.professor_id == request.user.id):
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        students = []
+        totals = [0, 0, 0]
+        rows = AttendanceSummary.objects.filter(course=course).order_by('student__username').values_list(
+            'student_id', 'student__username', 'present', 'late', 'absent'
+        )
+        for student_id, username, *counts in rows:
+            totals = [total + count for total, count in zip(totals, counts)]
+            students.append({"student_id": student_id, "student_name": username, **_summary_stats(*counts)})
+
+        return Response({"course_id": course.id, **_summary_stats(*totals), "students": students})
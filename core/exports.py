@@ -0,0 +1,174 @@
+import csv
+import os
+import time
+import uuid
+import logging
+from datetime import date
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from rest_framework import permissions, status, views
+from rest_framework.response import Response
+from core.redis_client import r
+
+logger = logging.getLogger(__name__)
+
+# Exports iterate querysets with .iterator(chunk_size) (server-side cursors on
+# Postgres), so memory stays flat: CSV is streamed to the client row by row,
+# Parquet is written one row group at a time by a Celery task.
+# Columns are [(name, type)] with a type from PARQUET_TYPES; rows are tuples in that order.
+
+class Echo:
+    """
+    File-like object for csv.writer that hands each line back instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+def stream_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in columns])
+    for row in rows:
+        yield writer.writerow(row)
+
+def csv_response(filename, columns, rows):
+    response = StreamingHttpResponse(stream_csv(columns, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def export_filters(request, date_range=False):
+    """
+    Export filters from the query string, as (filters, error_response).
+    Registrar (admin): every course; professors: their own courses.
+    Optional course_id, and with date_range start/end (YYYY-MM-DD).
+    """
+    user = request.user
+    if not (user.is_admin() or user.is_professor()):
+        return None, Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+    params = request.query_params
+    filters = {'professor_id': None if user.is_admin() else user.id}
+    try:
+        if params.get('course_id'):
+            filters['course_id'] = int(params['course_id'])
+        for param in ('start', 'end') if date_range else ():
+            if params.get(param):
+                filters[param] = date.fromisoformat(params[param]).isoformat()
+    except ValueError:
+        error = "course_id must be an integer, start/end dates (YYYY-MM-DD)" if date_range else "course_id must be an integer"
+        return None, Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+    return filters, None
+
+def export_filename(prefix, filters, extension, date_range=False):
+    scope = f"course{filters['course_id']}" if 'course_id' in filters else 'all'
+    if date_range:
+        scope = f"{scope}_{filters.get('start', 'begin')}_{filters.get('end', 'now')}"
+    return f"{prefix}_{scope}.{extension}"
+
+# Column types, resolved lazily so pyarrow is only needed by the Celery worker
+PARQUET_TYPES = {
+    'int': lambda pa: pa.int64(),
+    'float': lambda pa: pa.float64(),
+    'string': lambda pa: pa.string(),
+    'date': lambda pa: pa.date32(),
+    'timestamp': lambda pa: pa.timestamp('us', tz='UTC'),
+}
+
+def write_parquet(path, columns, rows, row_group_size=None):
+    """
+    Writes rows to a Parquet file, buffering at most one row group in memory.
+    Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    row_group_size = row_group_size or settings.EXPORT_ROW_GROUP_SIZE
+    schema = pa.schema([(name, PARQUET_TYPES[type_name](pa)) for name, type_name in columns])
+
+    def to_table(batch):
+        if not batch:
+            return schema.empty_table()
+        # Row tuples -> one array per column
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    total = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= row_group_size:
+                writer.write_table(to_table(batch))
+                total += len(batch)
+                batch = []
+        if batch or not total:
+            writer.write_table(to_table(batch))
+            total += len(batch)
+    return total
+
+# Parquet export jobs: export_job:{id} -> {status, user_id, filename, rows, error}
+def export_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'exports')
+
+def export_job_key(job_id):
+    return f"export_job:{job_id}"
+
+def export_path(job_id):
+    return os.path.join(export_dir(), f"{job_id}.parquet")
+
+def start_parquet_export(task, user, filename, filters):
+    """
+    Registers a job and queues `task(job_id, filters)`. Returns the job id.
+    """
+    job_id = uuid.uuid4().hex
+    key = export_job_key(job_id)
+    r.hset(key, mapping={'status': 'pending', 'user_id': user.id, 'filename': filename})
+    r.expire(key, settings.EXPORT_TTL)
+    task.delay(job_id, filters)
+    return job_id
+
+def purge_expired_exports():
+    cutoff = time.time() - settings.EXPORT_TTL
+    for entry in os.scandir(export_dir()):
+        if entry.name.endswith('.parquet') and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+def run_parquet_export(job_id, columns, rows):
+    """
+    Task body: writes the file and records the outcome on the job.
+    """
+    key = export_job_key(job_id)
+    r.hset(key, 'status', 'running')
+    try:
+        os.makedirs(export_dir(), exist_ok=True)
+        purge_expired_exports()
+        count = write_parquet(export_path(job_id), columns, rows)
+    except Exception as exc:
+        logger.exception("Parquet export %s failed", job_id)
+        r.hset(key, mapping={'status': 'failed', 'error': str(exc)})
+        raise
+    r.hset(key, mapping={'status': 'done', 'rows': count})
+    r.expire(key, settings.EXPORT_TTL)
+    return count
+
+def export_job_response(request, job_id):
+    return Response({
+        "job_id": job_id,
+        "status": "pending",
+        "download_url": request.build_absolute_uri(reverse('export-download', args=[job_id]))
+    }, status=status.HTTP_202_ACCEPTED)
+
+class ExportDownloadView(views.APIView):
+    """
+    Status of a Parquet export job; the file itself once it is done.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = {k.decode('utf-8'): v.decode('utf-8') for k, v in r.hgetall(export_job_key(job_id)).items()}
+        if not job or job.get('user_id') != str(request.user.id):
+            return Response({"error": "Export not found"}, status=status.HTTP_404_NOT_FOUND)
+        if job['status'] != 'done':
+            return Response({"job_id": job_id, "status": job['status'], "error": job.get('error')})
+        if not os.path.exists(export_path(job_id)):
+            return Response({"error": "Export expired"}, status=status.HTTP_410_GONE)
+        return FileResponse(open(export_path(job_id), 'rb'), as_attachment=True, filename=job['filename'])
@@ -0,0 +1,121 @@
+import base64
+import binascii
+import json
+from operator import attrgetter
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination: the next page starts after the last row's
+    ordering key instead of at an OFFSET, so every page is one index range
+    scan and rows written meanwhile do not shift pages.
+    Subclasses set `ordering`; its last field must be unique (e.g. id).
+    """
+    ordering = ('-id',)
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (ValueError, binascii.Error):
+            raise NotFound("Invalid cursor")
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        return position
+
+    def clean_position(self, queryset, position):
+        """
+        Converts the cursor's values with the ordering fields, so a crafted
+        cursor is a 404 rather than a database error.
+        """
+        values = []
+        for field_name, value in zip(self.ordering, position):
+            field = queryset.model._meta.get_field(field_name.lstrip('-'))
+            if field.is_relation:
+                field = field.target_field
+            if not isinstance(value, str):
+                raise NotFound("Invalid cursor")
+            try:
+                value = field.to_python(value)
+                field.run_validators(value)
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound("Invalid cursor")
+            values.append(value)
+        return values
+
+    def get_position(self, row):
+        return [str(attrgetter(field.lstrip('-'))(row)) for field in self.ordering]
+
+    def get_seek_filter(self, position):
+        # (a, b) after (x, y)  <=>  a past x, or a == x and b past y
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(self.clean_position(queryset, position)))
+
+        # One extra row tells whether there is a next page, without a COUNT
+        rows = list(queryset[:page_size + 1])
+        self.next_position = self.get_position(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+class AttendancePagination(KeysetPagination):
+    ordering = ('-date', '-id')
+
+class GradePagination(KeysetPagination):
+    ordering = ('course_id', 'id')
@@ -0,0 +1,140 @@
+import logging
+import redis
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+from core.redis_client import r
+
+logger = logging.getLogger(__name__)
+
+# Token buckets checked and consumed atomically in one script call.
+# KEYS: bucket keys. ARGV: rate1, burst1, rate2, burst2, ... (tokens/second, capacity)
+# Either every bucket gives one token or none is touched.
+# Returns {allowed, retry_after_seconds (as string, Lua truncates numbers)}.
+TOKEN_BUCKET_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+local wait = 0
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local level = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    level = math.min(burst, level + math.max(0, now - ts) * rate)
+    tokens[i] = level
+    if level < 1 then
+        wait = math.max(wait, (1 - level) / rate)
+    end
+end
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    redis.call('HSET', KEYS[i], 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil(burst / rate * 1000) + 1000)
+end
+return {1, '0'}
+"""
+
+token_bucket = r.register_script(TOKEN_BUCKET_LUA)
+
+def get_limit(scope, course_id=None):
+    """
+    Returns (rate, burst) for a scope, using the course override if there is one.
+    """
+    if course_id is not None:
+        override = settings.ATTENDANCE_COURSE_RATE_OVERRIDES.get(str(course_id), {})
+        if scope in override:
+            return tuple(override[scope])
+    return tuple(settings.ATTENDANCE_RATE_LIMITS[scope])
+
+def build_buckets(prefix, user_id=None, course_id=None):
+    """
+    Per-user, per-course and global buckets for an endpoint family,
+    as [(key, rate, burst)]. Scopes without a configured limit are skipped.
+    """
+    buckets = []
+    try:
+        course_id = int(course_id) if course_id is not None else None
+    except (TypeError, ValueError):
+        course_id = None
+
+    for level, ident in (('user', user_id), ('course', course_id), ('global', 'all')):
+        scope = f"{prefix}_{level}"
+        if ident is None or scope not in settings.ATTENDANCE_RATE_LIMITS:
+            continue
+        rate, burst = get_limit(scope, course_id)
+        buckets.append((f"ratelimit:{scope}:{ident}", rate, burst))
+    return buckets
+
+def _script_args(buckets):
+    keys = [key for key, _, _ in buckets]
+    args = []
+    for _, rate, burst in buckets:
+        args.extend([rate, burst])
+    return keys, args
+
+def acquire(buckets):
+    """
+    Takes one token from every bucket. Returns (allowed, retry_after_seconds).
+    Fails open if Redis is unavailable.
+    """
+    if not buckets:
+        return True, 0
+    keys, args = _script_args(buckets)
+    try:
+        allowed, wait = token_bucket(keys=keys, args=args)
+    except redis.RedisError:
+        logger.warning("Rate limiter unavailable, allowing request", exc_info=True)
+        return True, 0
+    return bool(allowed), float(wait)
+
+async def aacquire(client, buckets):
+    """
+    acquire() for redis.asyncio clients.
+    """
+    if not buckets:
+        return True, 0
+    keys, args = _script_args(buckets)
+    try:
+        allowed, wait = await client.register_script(TOKEN_BUCKET_LUA)(keys=keys, args=args)
+    except redis.RedisError:
+        logger.warning("Rate limiter unavailable, allowing request", exc_info=True)
+        return True, 0
+    return bool(allowed), float(wait)
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Admission control: rejects with 429 + Retry-After instead of queueing.
+    Subclasses set `prefix` (settings scopes are "{prefix}_user/_course/_global")
+    and may override get_course_id.
+    """
+    prefix = None
+
+    def get_course_id(self, request, view):
+        return view.kwargs.get('course_id') or request.query_params.get('course_id')
+
+    def allow_request(self, request, view):
+        user_id = request.user.id if request.user and request.user.is_authenticated else None
+        buckets = build_buckets(self.prefix, user_id, self.get_course_id(request, view))
+        allowed, self.retry_after = acquire(buckets)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+class CheckInThrottle(TokenBucketThrottle):
+    prefix = 'check_in'
+
+    def get_course_id(self, request, view):
+        data = request.data if isinstance(request.data, dict) else {}
+        return data.get('course_id')
+
+class GenerateQRThrottle(TokenBucketThrottle):
+    prefix = 'qr'
+
+class SheetThrottle(TokenBucketThrottle):
+    prefix = 'sheet'
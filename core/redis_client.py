@@ -0,0 +1,5 @@
+import redis
+from django.conf import settings
+
+# Redis connection, one pool per process shared by every module
+r = redis.Redis.from_url(settings.CELERY_BROKER_URL)
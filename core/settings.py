@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
+import json
 from datetime import timedelta
+from django.utils.crypto import salted_hmac
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -68,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
 
 # Database
@@ -153,3 +156,77 @@ SPECTACULAR_SETTINGS = {
 # Celery
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+
+CELERY_BEAT_SCHEDULE = {
+    'flush-check-ins': {
+        'task': 'attendance.tasks.flush_check_ins',
+        'schedule': 2.0,
+    },
+    'close-out-sessions': {
+        'task': 'attendance.tasks.close_out_sessions',
+        'schedule': 60.0,
+    },
+    'prewarm-classes': {
+        'task': 'attendance.tasks.prewarm_classes',
+        'schedule': 60.0,
+    },
+    'reconcile-presence': {
+        'task': 'attendance.tasks.reconcile_presence_bitmaps',
+        'schedule': 300.0,
+    },
+}
+
+# Attendance
+# Write-behind: queue accepted check-ins in Redis and persist them in batches
+ATTENDANCE_WRITE_BEHIND = bool(int(os.environ.get("ATTENDANCE_WRITE_BEHIND", 0)))
+ATTENDANCE_FLUSH_BATCH_SIZE = int(os.environ.get("ATTENDANCE_FLUSH_BATCH_SIZE", 500))
+# In-process cache of course session state (secret, location), per worker
+ATTENDANCE_LOCAL_CACHE_SIZE = int(os.environ.get("ATTENDANCE_LOCAL_CACHE_SIZE", 256))
+ATTENDANCE_LOCAL_CACHE_TTL = int(os.environ.get("ATTENDANCE_LOCAL_CACHE_TTL", 30))
+# Max rows per bulk (kiosk/offline) check-in upload
+ATTENDANCE_BULK_MAX_ROWS = int(os.environ.get("ATTENDANCE_BULK_MAX_ROWS", 1000))
+# Load location, enrollments and session secret into Redis this long before each class
+ATTENDANCE_PREWARM_MINUTES = int(os.environ.get("ATTENDANCE_PREWARM_MINUTES", 10))
+# QR code mode: 'totp' (random per-session secret kept in Redis) or
+# 'signed' (stateless HMAC token per 30s interval, verified without Redis)
+ATTENDANCE_TOKEN_MODE = os.environ.get("ATTENDANCE_TOKEN_MODE", "totp")
+# Comma-separated signing keys, newest first; older keys stay valid during rotation.
+# Unset, a key is derived from SECRET_KEY so QR tokens never sign with it directly.
+ATTENDANCE_SIGNING_KEYS = os.environ.get(
+    "ATTENDANCE_SIGNING_KEYS",
+    salted_hmac("attendance.tokens", "signing-key", secret=SECRET_KEY).hexdigest()
+).split(",")
+# Accepted clock skew for signed tokens, in 30s intervals either side
+ATTENDANCE_TOKEN_SKEW = int(os.environ.get("ATTENDANCE_TOKEN_SKEW", 1))
+
+# Admission control (token buckets) on the attendance hot path.
+# scope: (tokens per second, burst). Scopes are "{endpoint}_user/_course/_global".
+ATTENDANCE_RATE_LIMITS = {
+    'check_in_user': (0.2, 3),
+    'check_in_course': (40, 400),
+    'check_in_global': (300, 1500),
+    'qr_user': (1, 5),
+    'qr_course': (2, 10),
+    'qr_global': (50, 200),
+    'sheet_user': (1, 5),
+    'sheet_course': (2, 10),
+    'sheet_global': (50, 200),
+}
+# Per-course overrides for big lecture halls, e.g. '{"12": {"check_in_course": [100, 1000]}}'
+ATTENDANCE_COURSE_RATE_OVERRIDES = json.loads(os.environ.get("ATTENDANCE_COURSE_RATE_OVERRIDES", "{}"))
+
+# Exports (CSV streamed, Parquet written by Celery into MEDIA_ROOT/exports)
+# Rows fetched per server-side cursor round-trip / written per Parquet row group
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 2000))
+EXPORT_ROW_GROUP_SIZE = int(os.environ.get("EXPORT_ROW_GROUP_SIZE", 50000))
+# How long a finished Parquet export stays downloadable (seconds)
+EXPORT_TTL = int(os.environ.get("EXPORT_TTL", 3600 * 24))
+
+# Grades
+# Cached course statistics expire after this long even without grade changes (seconds)
+GRADE_STATS_CACHE_TTL = int(os.environ.get("GRADE_STATS_CACHE_TTL", 3600))
+# Statistics engine: "pandas", "sql" (aggregates in the database) or "auto" (sql from the threshold up)
+GRADE_STATS_ENGINE = os.environ.get("GRADE_STATS_ENGINE", "auto")
+GRADE_STATS_SQL_THRESHOLD = int(os.environ.get("GRADE_STATS_SQL_THRESHOLD", 500))
+# Rows per upsert statement in grade imports
+GRADE_IMPORT_BATCH_SIZE = int(os.environ.get("GRADE_IMPORT_BATCH_SIZE", 500))
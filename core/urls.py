@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from core.exports import ExportDownloadView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,6 +10,7 @@ urlpatterns = [
     path('api/courses/', include('courses.urls')),
     path('api/', include('attendance.urls')),
     path('api/', include('grades.urls')),
+    path('api/exports/<str:job_id>/', ExportDownloadView.as_view(), name='export-download'),
     
     # Auth (SimpleJWT)
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -27,7 +27,13 @@ class CourseViewSet(viewsets.ModelViewSet):
             if any(field in self.request.data for field in ['latitude', 'longitude', 'allowed_radius']):
                 from rest_framework.exceptions import PermissionDenied
                 raise PermissionDenied("교수는 강의실 위치나 반경을 변경할 수 없습니다. 관리자에게 문의하세요.")
-        serializer.save()
+        course = serializer.save()
+
+        if any(field in self.request.data for field in ['latitude', 'longitude', 'allowed_radius']):
+            # Refresh the cached geofence and drop every worker's local copy
+            from attendance.services import cache_course_location, invalidate_course_session
+            cache_course_location(course.id, course=course)
+            invalidate_course_session(course.id)
 
     def get_queryset(self):
         user = self.request.user
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useQuery, useMutation } from '@tanstack/react-query';
 import client from '../api/client';
+import { useAuthStore } from '../store/authStore';
 import { RefreshCw, Clock } from 'lucide-react';
 import { QRCodeSVG } from 'qrcode.react';
 
@@ -8,22 +9,13 @@ const AttendanceProfessor: React.FC = () => {
     // 1. State Hooks
     const [selectedCourseId, setSelectedCourseId] = useState<string>('');
     const [generatedData, setGeneratedData] = useState<{ code: string, valid_for: string } | null>(null);
+    const [streamCourseId, setStreamCourseId] = useState<string>(''); // Course whose QR stream is open
     const [timeLeft, setTimeLeft] = useState<number>(30); // Countdown state
 
     // Manual Attendance Hooks (Moved to top)
     const [sheetData, setSheetData] = useState<any[]>([]);
     const [selectedDate, setSelectedDate] = useState<string>(new Date().toISOString().split('T')[0]);
-
-    const { refetch: fetchSheet } = useQuery({
-        queryKey: ['attendance-sheet', selectedCourseId, selectedDate],
-        queryFn: async () => {
-            if (!selectedCourseId) return [];
-            const res = await client.get(`/attendance/sheet/?course_id=${selectedCourseId}&date=${selectedDate}`);
-            setSheetData(res.data);
-            return res.data;
-        },
-        enabled: !!selectedCourseId
-    });
+    const [rosterCount, setRosterCount] = useState<{ present: number, total: number } | null>(null);
 
     const updateMutation = useMutation({
         mutationFn: async (data: { student_id: number, status: string }) => {
@@ -32,8 +24,8 @@ const AttendanceProfessor: React.FC = () => {
                 date: selectedDate,
                 ...data
             });
-        },
-        onSuccess: () => fetchSheet()
+        }
+        // The roster stream delivers the change
     });
 
     const batchAbsentMutation = useMutation({
@@ -43,19 +35,9 @@ const AttendanceProfessor: React.FC = () => {
                 date: selectedDate
             });
         },
-        onSuccess: (data) => {
-            alert(data.data.message);
-            fetchSheet();
-        }
+        onSuccess: (data) => alert(data.data.message)
     });
 
-    // Auto-fetch sheet when course/date changes
-    useEffect(() => {
-        if (selectedCourseId) {
-            fetchSheet();
-        }
-    }, [selectedCourseId, selectedDate, fetchSheet]);
-
     // 2. Data Fetching Hooks
     const { data: courses, isLoading, isError, error } = useQuery({
         queryKey: ['my-courses'],
@@ -73,27 +55,60 @@ const AttendanceProfessor: React.FC = () => {
     // 3. Helper Functions
     const generateCode = async () => {
         if (!selectedCourseId) return;
-        try {
-            const res = await client.get(`/attendance/generate-qr/${selectedCourseId}/`);
-            setGeneratedData(res.data);
-            setTimeLeft(30); // Reset countdown
-        } catch (e) {
-            console.error('Failed to generate code', e);
-        }
+        // Opening the session is explicit; the stream below only shows its codes
+        const res = await client.post(`/attendance/generate-qr/${selectedCourseId}/`);
+        setGeneratedData({ code: res.data.code, valid_for: res.data.valid_for });
+        setStreamCourseId(selectedCourseId);
     };
 
     // 4. Effect Hooks
-    // Auto-refresh hook (30s)
+    // QR stream (SSE): the server pushes the next code at each 30s boundary
     useEffect(() => {
-        let interval: number | undefined;
-        if (generatedData && selectedCourseId) {
-            interval = window.setInterval(() => {
-                generateCode();
-            }, 30000);
-        }
-        return () => window.clearInterval(interval);
-        // eslint-disable-next-line react-hooks/exhaustive-deps
-    }, [generatedData, selectedCourseId]);
+        if (!streamCourseId) return;
+        const token = useAuthStore.getState().token ?? '';
+        const source = new EventSource(`/api/attendance/qr-stream/${streamCourseId}/?token=${encodeURIComponent(token)}`);
+        source.addEventListener('code', (event) => {
+            const data = JSON.parse((event as MessageEvent).data);
+            setGeneratedData({ code: data.code, valid_for: `${data.valid_for}s` });
+            setTimeLeft(Math.max(0, Math.round(data.expires_at - Date.now() / 1000)));
+        });
+        // The session was closed: stop, or EventSource would keep reconnecting
+        source.addEventListener('closed', () => {
+            source.close();
+            setGeneratedData(null);
+            setStreamCourseId('');
+        });
+        source.onerror = () => console.error('QR stream disconnected, retrying...');
+        return () => source.close();
+    }, [streamCourseId]);
+
+    // Live roster stream (SSE): the sheet's only source. Full sheet on every
+    // (re)connect, then only changed students, including our own edits
+    useEffect(() => {
+        if (!selectedCourseId) return;
+        const token = useAuthStore.getState().token ?? '';
+        const source = new EventSource(
+            `/api/attendance/roster-stream/?course_id=${selectedCourseId}&date=${selectedDate}&token=${encodeURIComponent(token)}`
+        );
+        source.addEventListener('roster', (event) => {
+            const data = JSON.parse((event as MessageEvent).data);
+            setSheetData(data.students);
+            setRosterCount({ present: data.present, total: data.total });
+        });
+        source.addEventListener('update', (event) => {
+            const data = JSON.parse((event as MessageEvent).data);
+            setSheetData((prev) => prev.map((student) =>
+                student.student_id === data.student_id ? { ...student, status: data.status } : student
+            ));
+            setRosterCount({ present: data.present, total: data.total });
+        });
+        source.onerror = () => console.error('Roster stream disconnected, retrying...');
+        return () => {
+            source.close();
+            setSheetData([]);
+            setRosterCount(null);
+        };
+    }, [selectedCourseId, selectedDate]);
 
     // Countdown Timer Hook (1s)
     useEffect(() => {
@@ -150,6 +165,7 @@ const AttendanceProfessor: React.FC = () => {
                         onChange={(e) => {
                             setSelectedCourseId(e.target.value);
                             setGeneratedData(null);
+                            setStreamCourseId('');
                         }}
                     >
                         <option value="">강의를 선택하세요</option>
@@ -223,6 +239,11 @@ const AttendanceProfessor: React.FC = () => {
                                 value={selectedDate}
                                 onChange={(e) => setSelectedDate(e.target.value)}
                             />
+                            {rosterCount && (
+                                <span className="text-sm font-normal text-gray-500">
+                                    출석 {rosterCount.present} / {rosterCount.total}
+                                </span>
+                            )}
                         </h2>
                         <button
                             onClick={() => batchAbsentMutation.mutate()}
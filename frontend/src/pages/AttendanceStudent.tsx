@@ -86,14 +86,14 @@ const AttendanceStudent: React.FC = () => {
                 </div>
 
                 <div>
-                    <label className="block text-sm font-medium text-gray-700 mb-2">6-Digit Code</label>
+                    <label className="block text-sm font-medium text-gray-700 mb-2">Attendance Code</label>
                     <div className="relative">
                         <QrCode className="absolute left-3 top-3 text-gray-400" size={20} />
                         <input
                             type="text"
                             value={code}
-                            maxLength={6}
-                            onChange={(e) => setCode(e.target.value)}
+                            maxLength={16}
+                            onChange={(e) => setCode(e.target.value.trim())}
                             className="w-full pl-10 p-3 border border-gray-200 rounded-xl focus:ring-2 focus:ring-blue-500 font-mono tracking-widest"
                             placeholder="000000"
                         />
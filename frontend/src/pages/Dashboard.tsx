@@ -32,8 +32,8 @@ const Dashboard: React.FC = () => {
                 };
 
                 return {
-                    grades: gradeRes.data,
-                    attendance: attendanceRes.data,
+                    grades: getList(gradeRes), // First page (keyset-paginated)
+                    attendance: getList(attendanceRes), // First page (keyset-paginated)
                     courses: getList(courseRes), // Handle potential pagination
                     userStats: userStatsRes.data,
                     attendanceStats: attendanceStatsRes.data
@@ -6,6 +6,12 @@ export default defineConfig({
   plugins: [react()],
   server: {
     proxy: {
+      // Async views and SSE streams are served by the ASGI server (web-asgi)
+      '^/api/attendance/(qr-stream|roster-stream|check-in/async)/': {
+        target: 'http://localhost:8001',
+        changeOrigin: true,
+        secure: false,
+      },
       '/api': {
         target: 'http://localhost:8000',
         changeOrigin: true,
@@ -23,3 +23,21 @@ class Grade(models.Model):
 
     def __str__(self):
         return f"Grade: {self.student} - {self.course}"
+
+class GradingPolicy(models.Model):
+    """
+    How a course's final_score is computed from Grade.details.
+    When a course has one, final_score is always computed server-side.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, related_name='grading_policy')
+
+    # Weighted categories of details criteria, e.g.
+    # {"quizzes": {"weight": 30, "criteria": ["quiz1", "quiz2", "quiz3"], "max_points": 10, "drop_lowest": 1},
+    #  "exams": {"weight": 70, "criteria": ["midterm", "final"], "cap": 100}}
+    categories = models.JSONField(default=dict)
+    # Upper bound of the final score (e.g. 100 with extra credit), None for none
+    final_cap = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Grading policy: {self.course}"
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Grade
+from .models import Grade, GradingPolicy
+from .services import validate_grading_policy
 
 class GradeSerializer(serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.username', read_only=True)
@@ -7,3 +8,16 @@ class GradeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Grade
         fields = '__all__'
+
+class GradingPolicySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GradingPolicy
+        fields = ['course', 'categories', 'final_cap', 'updated_at']
+        read_only_fields = ['course', 'updated_at']
+
+    def validate_categories(self, value):
+        try:
+            validate_grading_policy(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
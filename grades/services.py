@@ -1,38 +1,522 @@
+import csv
+import json
+import math
+import codecs
+import zipfile
+import hashlib
+import logging
+import redis
+import numpy as np
 import pandas as pd
-from .models import Grade
-from django.db.models import F
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Grade, GradingPolicy
+from django.db.models import F, Avg, Count, Max, Min, StdDev
+from core.redis_client import r
 
-def calculate_course_statistics(course_id):
+logger = logging.getLogger(__name__)
+
+# Course stats cache: grade_stats:{course} holds "{version}|{json}", valid while
+# grade_stats_version:{course} still equals that version. Every Grade write
+# bumps the version (see grades.signals), so a stale entry is never read and a
+# computation racing a write cannot overwrite newer data.
+def stats_version_key(course_id):
+    return f"grade_stats_version:{course_id}"
+
+def stats_key(course_id):
+    return f"grade_stats:{course_id}"
+
+def bump_stats_version(course_id):
+    r.incr(stats_version_key(course_id))
+
+def invalidate_course_stats(course_id):
+    """
+    Bumps the course's stats version once the current transaction commits,
+    so a recomputation cannot cache the pre-commit rows.
+    """
+    def apply():
+        try:
+            bump_stats_version(course_id)
+        except redis.RedisError:
+            logger.warning("Could not invalidate stats for course %s", course_id, exc_info=True)
+    transaction.on_commit(apply)
+
+def get_course_statistics(course_id, engine=None):
+    """
+    calculate_course_statistics() behind the cache: one MGET on a hit.
+    """
+    try:
+        version, cached = r.mget(stats_version_key(course_id), stats_key(course_id))
+    except redis.RedisError:
+        logger.warning("Stats cache unavailable", exc_info=True)
+        return calculate_course_statistics(course_id, engine)
+
+    version = int(version or 0)
+    if cached is not None:
+        cached_version, _, payload = cached.decode('utf-8').partition('|')
+        if int(cached_version) == version:
+            return json.loads(payload)
+
+    stats = calculate_course_statistics(course_id, engine)
+    try:
+        r.set(stats_key(course_id), f"{version}|{json.dumps(stats)}", ex=settings.GRADE_STATS_CACHE_TTL)
+    except redis.RedisError:
+        logger.warning("Stats cache unavailable", exc_info=True)
+    return stats
+
+# Statistics engines. Both return the same dict (NaN reported as None):
+# count, mean/std/max/min of final_score and mean_{criterion} per details key.
+# "pandas" loads the course into a DataFrame; "sql" aggregates in the database,
+# so only one row per criterion leaves it. "auto" picks "sql" from
+# GRADE_STATS_SQL_THRESHOLD grades up, where the database supports it.
+STATS_ENGINES = ('auto', 'pandas', 'sql')
+
+def _clean(value):
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+def calculate_course_statistics(course_id, engine=None):
+    """
+    Calculates statistics for a course with the given engine (default: GRADE_STATS_ENGINE).
+    """
+    engine = engine or settings.GRADE_STATS_ENGINE
+    if engine not in STATS_ENGINES:
+        raise ValueError(f"Unknown statistics engine: {engine}")
+    if engine == 'auto':
+        large = Grade.objects.filter(course_id=course_id).count() >= settings.GRADE_STATS_SQL_THRESHOLD
+        engine = 'sql' if large and connection.vendor in CRITERION_MEANS_SQL else 'pandas'
+    if engine == 'sql':
+        return _sql_course_statistics(course_id)
+    return _pandas_course_statistics(course_id)
+
+def _json_number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+def criteria_frame(details):
+    """
+    One float column per top-level details key, for a list of details dicts.
+    Anything that is not a JSON number (strings, booleans, nested objects) is
+    NaN, the same values the sql engine skips.
+    """
+    return pd.DataFrame(list(details)).map(_json_number).astype(float)
+
+def _pandas_course_statistics(course_id):
     """
     Calculates statistics for a course using Pandas Vectorization.
     """
-    # Fetch data efficiently
-    # We want student ID and their grade details/final score
-    grades_qs = Grade.objects.filter(course_id=course_id).values('student__username', 'details', 'final_score')
+    grades = list(Grade.objects.filter(course_id=course_id).values('details', 'final_score'))
     
-    if not grades_qs.exists():
+    if not grades:
         return None
 
-    df = pd.DataFrame(list(grades_qs))
-    
-    # Expand JSONB 'details' into columns
-    # Assuming details is like {'quiz1': 10, 'midterm': 50}
-    details_df = pd.json_normalize(df['details'])
-    df = pd.concat([df.drop(['details'], axis=1), details_df], axis=1)
+    df = pd.DataFrame(grades)
+    scores = df['final_score'].astype(float)
     
     # Calculate stats
     stats = {
         'count': len(df),
-        'mean_final': df['final_score'].mean(),
-        'std_final': df['final_score'].std(),
-        'max_final': df['final_score'].max(),
-        'min_final': df['final_score'].min(),
+        'mean_final': _clean(scores.mean()),
+        'std_final': _clean(scores.std()),
+        'max_final': _clean(scores.max()),
+        'min_final': _clean(scores.min()),
     }
     
-    # Example: Calculate average for each assignment (vectorized)
-    # We iterate over columns that are not metadata
-    assignment_cols = [c for c in df.columns if c not in ['student__username', 'final_score']]
-    for col in assignment_cols:
-         stats[f'mean_{col}'] = df[col].mean()
+    # Average for each assignment (vectorized); criteria without numbers report None
+    criteria = criteria_frame(df['details'])
+    for col in criteria.columns:
+        stats[f'mean_{col}'] = _clean(criteria[col].mean())
 
     return stats
+
+# Mean per top-level key of details, grouped in the database. As in
+# criteria_frame, only JSON numbers count; a key without any (strings, nested
+# objects) is still reported, with mean None.
+CRITERION_MEANS_SQL = {
+    'postgresql': """
+        SELECT criterion.key, AVG(CASE WHEN jsonb_typeof(criterion.value) = 'number'
+                                  THEN (criterion.value #>> '{{}}')::double precision END)
+        FROM {table} grade, jsonb_each(grade.details) criterion
+        WHERE grade.course_id = %s
+        GROUP BY criterion.key
+    """,
+    'sqlite': """
+        SELECT criterion.key, AVG(CASE WHEN criterion.type IN ('integer', 'real') THEN criterion.value END)
+        FROM {table} grade, json_each(grade.details) criterion
+        WHERE grade.course_id = %s
+        GROUP BY criterion.key
+    """,
+}
+
+def _sql_course_statistics(course_id):
+    if connection.vendor not in CRITERION_MEANS_SQL:
+        raise ValueError(f"The sql statistics engine does not support {connection.vendor}")
+
+    grades = Grade.objects.filter(course_id=course_id)
+    totals = grades.aggregate(
+        count=Count('id'),
+        scored=Count('final_score'),
+        mean_final=Avg('final_score'),
+        max_final=Max('final_score'),
+        min_final=Min('final_score'),
+    )
+    if not totals['count']:
+        return None
+
+    # SQLite's STDDEV_SAMP raises on NULLs or fewer than two values instead of returning NULL
+    std = None
+    if totals['scored'] > 1:
+        std = grades.filter(final_score__isnull=False).aggregate(std=StdDev('final_score', sample=True))['std']
+    stats = {
+        'count': totals['count'],
+        'mean_final': _clean(totals['mean_final']),
+        'std_final': _clean(std),
+        'max_final': _clean(totals['max_final']),
+        'min_final': _clean(totals['min_final']),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(CRITERION_MEANS_SQL[connection.vendor].format(table=Grade._meta.db_table), [course_id])
+        for criterion, mean in cursor.fetchall():
+            stats[f'mean_{criterion}'] = _clean(mean)
+    return stats
+
+# Multi-course analytics: every requested course in one query and one grouped
+# pandas pass. Results are cached under a key derived from each course's stats
+# version, so any grade write in one of them makes the key miss.
+ANALYTICS_PERCENTILES = (0.1, 0.5, 0.9)
+# Final score histogram bins (0-10, ..., 90-100); out-of-range scores go to the end bins
+HISTOGRAM_EDGES = np.arange(0, 101, 10)
+# Guards against queuing the same computation twice; expires if the worker dies
+ANALYTICS_PENDING_TTL = 300
+
+def calculate_course_analytics(course_ids):
+    """
+    {course_id: stats} with the per-course summary, p10/p50/p90 and a histogram
+    of final_score, and per-criterion means. None for courses without grades.
+    """
+    course_ids = sorted(set(course_ids))
+    rows = Grade.objects.filter(course_id__in=course_ids).values_list('course_id', 'final_score', 'details')
+    df = pd.DataFrame(list(rows), columns=['course_id', 'final_score', 'details'])
+    analytics = dict.fromkeys(course_ids)
+    if df.empty:
+        return analytics
+
+    df['final_score'] = df['final_score'].astype(float)
+    scores = df.groupby('course_id')['final_score']
+    summary = scores.agg(count='size', mean_final='mean', std_final='std', max_final='max', min_final='min')
+    percentiles = scores.quantile(list(ANALYTICS_PERCENTILES)).unstack()
+
+    # Bin index per score, then counts per (course, bin)
+    scored = df.dropna(subset=['final_score'])
+    bins = np.clip(np.searchsorted(HISTOGRAM_EDGES, scored['final_score'].to_numpy(), side='right') - 1, 0, len(HISTOGRAM_EDGES) - 2)
+    histograms = pd.crosstab(scored['course_id'].to_numpy(), bins).reindex(
+        index=summary.index, columns=range(len(HISTOGRAM_EDGES) - 1), fill_value=0
+    )
+
+    # details expanded once for all courses
+    criteria = criteria_frame(df['details'])
+    criterion_means = criteria.groupby(df['course_id'].to_numpy()).mean()
+
+    for course_id, row in summary.iterrows():
+        stats = {'count': int(row['count'])}
+        stats.update({name: _clean(row[name]) for name in ('mean_final', 'std_final', 'max_final', 'min_final')})
+        stats.update({f'p{round(q * 100)}': _clean(percentiles.at[course_id, q]) for q in ANALYTICS_PERCENTILES})
+        stats['histogram'] = {
+            'edges': HISTOGRAM_EDGES.tolist(),
+            'counts': [int(count) for count in histograms.loc[course_id]],
+        }
+        # Only criteria the course has scores for
+        if course_id in criterion_means.index:
+            for criterion, mean in criterion_means.loc[course_id].items():
+                if not math.isnan(mean):
+                    stats[f'mean_{criterion}'] = float(mean)
+        analytics[course_id] = stats
+    return analytics
+
+def analytics_key(course_ids):
+    versions = r.mget([stats_version_key(course_id) for course_id in course_ids])
+    state = [[course_id, int(version or 0)] for course_id, version in zip(course_ids, versions)]
+    return f"grade_analytics:{hashlib.sha1(json.dumps(state).encode('utf-8')).hexdigest()}"
+
+def request_course_analytics(course_ids):
+    """
+    Cached analytics for the courses, or None after queuing their computation
+    (once per key) on Celery; poll again for the result.
+    """
+    from .tasks import compute_grade_analytics
+    course_ids = sorted(set(course_ids))
+    key = analytics_key(course_ids)
+    cached = r.get(key)
+    if cached is not None:
+        return json.loads(cached)
+    if r.set(f"{key}:pending", 1, nx=True, ex=ANALYTICS_PENDING_TTL):
+        compute_grade_analytics.delay(course_ids, key)
+    return None
+
+def store_course_analytics(key, analytics):
+    with r.pipeline() as pipe:
+        pipe.set(key, json.dumps(analytics), ex=settings.GRADE_STATS_CACHE_TTL)
+        pipe.delete(f"{key}:pending")
+        pipe.execute()
+
+EXPORT_COLUMNS = [
+    ('student_id', 'int'),
+    ('student_name', 'string'),
+    ('course_id', 'int'),
+    ('course_code', 'string'),
+    ('final_score', 'float'),
+    ('details', 'string'), # JSON
+    ('updated_at', 'timestamp'),
+]
+
+def export_grade_rows(filters):
+    """
+    Row tuples (EXPORT_COLUMNS) for an export, read through a server-side
+    cursor in chunks. filters: professor_id (None = all courses), course_id.
+    """
+    grades = Grade.objects.all()
+    if filters.get('professor_id') is not None:
+        grades = grades.filter(course__professor_id=filters['professor_id'])
+    if filters.get('course_id'):
+        grades = grades.filter(course_id=filters['course_id'])
+    rows = grades.order_by('course_id', 'student_id').values_list(
+        'student_id', 'student__username', 'course_id', 'course__code', 'final_score', 'details', 'updated_at'
+    ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    for *fields, details, updated_at in rows:
+        yield (*fields, json.dumps(details), updated_at)
+
+# Grade import: a CSV or XLSX sheet with a header row. One column identifies
+# the student (student_id or username), final_score is optional and every other
+# column is a criterion merged into details. Empty cells keep the stored value.
+IMPORT_ID_COLUMNS = ('student_id', 'username')
+
+def read_table_rows(upload):
+    """
+    Iterates the rows of an uploaded CSV/XLSX file as lists of cells, reading
+    it incrementally rather than loading it whole.
+    """
+    if not upload.name.lower().endswith('.xlsx'):
+        try:
+            yield from csv.reader(codecs.iterdecode(upload, 'utf-8-sig'))
+        except (csv.Error, UnicodeDecodeError):
+            raise ValueError("The file is not a valid UTF-8 CSV file.")
+        return
+
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ValueError("XLSX import is not available; upload a CSV file instead.")
+    try:
+        workbook = load_workbook(upload, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError):
+        raise ValueError("The file is not a valid XLSX workbook.")
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store ids as floats
+        value = int(value)
+    return str(value).strip()
+
+def _parse_score(value):
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid score {value!r}")
+    if isinstance(value, (int, float)):
+        score = float(value)
+    else:
+        text = _cell_text(value)
+        if not text:
+            return None
+        try:
+            score = float(text)
+        except ValueError:
+            raise ValueError(f"Invalid score {text!r}")
+    if not math.isfinite(score):
+        raise ValueError(f"Invalid score {value!r}")
+    return score
+
+def _upsert_grades(course_id, batch, policy=None):
+    """
+    Merges a batch of (student_id, final_score, scores) into the stored grades
+    and writes them with one INSERT ... ON CONFLICT DO UPDATE. With a grading
+    policy, final_score is computed from the merged details instead.
+    """
+    existing = {
+        student_id: (details, final_score)
+        for student_id, details, final_score in Grade.objects.select_for_update().filter(
+            course_id=course_id, student_id__in={student_id for student_id, _, _ in batch}
+        ).values_list('student_id', 'details', 'final_score')
+    }
+    grades = {}
+    for student_id, final_score, scores in batch:
+        grade = grades.get(student_id)
+        if grade is None:
+            details, current = existing.get(student_id, ({}, None))
+            grade = grades[student_id] = Grade(student_id=student_id, course_id=course_id, details=dict(details), final_score=current)
+        grade.details.update(scores)
+        if final_score is not None:
+            grade.final_score = final_score
+    if policy is not None:
+        scores = compute_final_scores(policy, [grade.details for grade in grades.values()])
+        for grade, score in zip(grades.values(), scores.tolist()):
+            grade.final_score = score
+    Grade.objects.bulk_create(
+        grades.values(),
+        update_conflicts=True,
+        unique_fields=['student', 'course'],
+        update_fields=['details', 'final_score', 'updated_at']
+    )
+
+def import_grades(course_id, rows):
+    """
+    Upserts grades for a course from table rows (header first), in batches of
+    GRADE_IMPORT_BATCH_SIZE inside one transaction. Rows that fail validation
+    are skipped and reported. Returns (imported, [{row, error}]).
+    Raises ValueError when the file itself is unusable.
+    """
+    from courses.models import Enrollment
+    rows = iter(rows)
+    header = [_cell_text(cell) for cell in next(rows, ())]
+    id_column = next((column for column in IMPORT_ID_COLUMNS if column in header), None)
+    if id_column is None:
+        raise ValueError("The file needs a student_id or username column.")
+    id_index = header.index(id_column)
+    score_index = header.index('final_score') if 'final_score' in header else None
+    criteria = [
+        (index, name) for index, name in enumerate(header)
+        if name and name not in IMPORT_ID_COLUMNS and index != score_index
+    ]
+
+    # Membership for the whole file from one query
+    enrolled = {}
+    for student_id, username in Enrollment.objects.filter(course_id=course_id, is_active=True).values_list(
+        'student_id', 'student__username'
+    ):
+        enrolled[str(student_id) if id_column == 'student_id' else username] = student_id
+
+    policy = GradingPolicy.objects.filter(course_id=course_id).first()
+    imported, errors, batch = 0, [], []
+    with transaction.atomic():
+        # Row numbers as shown in a spreadsheet: the header is row 1
+        for number, row in enumerate(rows, start=2):
+            row = list(row) + [None] * (len(header) - len(row))
+            if not any(_cell_text(cell) for cell in row):
+                continue
+            identifier = _cell_text(row[id_index])
+            student_id = enrolled.get(identifier)
+            if student_id is None:
+                errors.append({"row": number, "error": f"{id_column} {identifier!r} is not enrolled in this course."})
+                continue
+            try:
+                final_score = _parse_score(row[score_index]) if score_index is not None else None
+                scores = {}
+                for index, name in criteria:
+                    score = _parse_score(row[index])
+                    if score is not None:
+                        scores[name] = int(score) if score.is_integer() else score
+            except ValueError as exc:
+                errors.append({"row": number, "error": str(exc)})
+                continue
+
+            batch.append((student_id, final_score, scores))
+            if len(batch) >= settings.GRADE_IMPORT_BATCH_SIZE:
+                _upsert_grades(course_id, batch, policy)
+                imported += len(batch)
+                batch = []
+        if batch:
+            _upsert_grades(course_id, batch, policy)
+            imported += len(batch)
+        # bulk_create sends no post_save signals
+        if imported:
+            invalidate_course_stats(course_id)
+    return imported, errors
+
+# Grading policies (GradingPolicy.categories): each category is the mean
+# percentage of its criteria (score / max_points * 100; missing or non-numeric
+# scores count as 0) after dropping the drop_lowest lowest, capped at cap.
+# The final score is the weighted mean of the categories, capped at final_cap.
+POLICY_CATEGORY_FIELDS = {'weight', 'criteria', 'max_points', 'drop_lowest', 'cap'}
+RECOMPUTE_BATCH_SIZE = 500
+
+def validate_grading_policy(categories):
+    """
+    Raises ValueError describing the first problem in a categories mapping.
+    """
+    if not isinstance(categories, dict) or not categories:
+        raise ValueError("At least one category is required.")
+    for name, category in categories.items():
+        if not isinstance(category, dict):
+            raise ValueError(f"{name}: must be an object.")
+        unknown = set(category) - POLICY_CATEGORY_FIELDS
+        if unknown:
+            raise ValueError(f"{name}: unknown fields {', '.join(sorted(unknown))}.")
+        criteria = category.get('criteria')
+        if not isinstance(criteria, list) or not criteria or not all(isinstance(c, str) and c for c in criteria):
+            raise ValueError(f"{name}: criteria must be a non-empty list of names.")
+        for field in ('weight', 'max_points', 'cap'):
+            value = category.get(field)
+            if field == 'weight' and value is None:
+                raise ValueError(f"{name}: weight is required.")
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                raise ValueError(f"{name}: {field} must be a positive number.")
+        drop = category.get('drop_lowest', 0)
+        if isinstance(drop, bool) or not isinstance(drop, int) or not 0 <= drop < len(criteria):
+            raise ValueError(f"{name}: drop_lowest must be between 0 and {len(criteria) - 1}.")
+
+def compute_final_scores(policy, details):
+    """
+    Final scores (NumPy array, 2 decimals) for a list of details dicts under a
+    policy, vectorized across all of them.
+    """
+    frame = criteria_frame(details)
+    total = np.zeros(len(frame))
+    weights = 0
+    for category in policy.categories.values():
+        points = frame.reindex(columns=category['criteria'])
+        percent = points.fillna(0).to_numpy(dtype=float) / category.get('max_points', 100) * 100
+        # Drop the lowest per row: sort each row, skip the first columns
+        percent = np.sort(percent, axis=1)[:, category.get('drop_lowest', 0):].mean(axis=1)
+        if category.get('cap') is not None:
+            percent = np.minimum(percent, category['cap'])
+        total += category['weight'] * percent
+        weights += category['weight']
+    final = total / weights
+    if policy.final_cap is not None:
+        final = np.minimum(final, policy.final_cap)
+    return np.round(final, 2)
+
+def recompute_final_scores(course_id):
+    """
+    Recomputes final_score for every grade of the course from its policy in
+    one pass and saves the changed ones with bulk_update. Returns the number updated.
+    """
+    policy = GradingPolicy.objects.filter(course_id=course_id).first()
+    if policy is None:
+        return 0
+    grades = list(Grade.objects.filter(course_id=course_id).only('id', 'details', 'final_score'))
+    if not grades:
+        return 0
+
+    now = timezone.now()
+    changed = []
+    for grade, score in zip(grades, compute_final_scores(policy, [grade.details for grade in grades]).tolist()):
+        if grade.final_score != score:
+            grade.final_score = score
+            # bulk_update does not apply auto_now
+            grade.updated_at = now
+            changed.append(grade)
+
+    if changed:
+        with transaction.atomic():
+            Grade.objects.bulk_update(changed, ['final_score', 'updated_at'], batch_size=RECOMPUTE_BATCH_SIZE)
+            # bulk_update sends no post_save signals
+            invalidate_course_stats(course_id)
+    return len(changed)
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Grade, GradingPolicy
+from .services import invalidate_course_stats, compute_final_scores
+
+# Invalidate the cached course stats on every Grade write.
+# Queryset .update()/bulk writes bypass signals and must call invalidate_course_stats.
+
+@receiver(pre_save, sender=Grade)
+def apply_grading_policy(sender, instance, raw=False, update_fields=None, **kwargs):
+    # With a policy the client-sent final_score is replaced by the computed one
+    if raw or (update_fields is not None and 'details' not in update_fields):
+        return
+    policy = GradingPolicy.objects.filter(course_id=instance.course_id).first()
+    if policy is not None:
+        instance.final_score = compute_final_scores(policy, [instance.details]).tolist()[0]
+
+@receiver(post_save, sender=Grade)
+def grade_saved(sender, instance, **kwargs):
+    invalidate_course_stats(instance.course_id)
+
+@receiver(post_delete, sender=Grade)
+def grade_deleted(sender, instance, **kwargs):
+    invalidate_course_stats(instance.course_id)
+
+@receiver(post_save, sender=GradingPolicy)
+def policy_saved(sender, instance, **kwargs):
+    # Every grade of the course, on Celery once the policy is committed
+    from .tasks import recompute_course_final_scores
+    transaction.on_commit(lambda: recompute_course_final_scores.delay(instance.course_id))
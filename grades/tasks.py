@@ -0,0 +1,17 @@
+from celery import shared_task
+from core.exports import run_parquet_export
+from .services import (
+    export_grade_rows, EXPORT_COLUMNS, calculate_course_analytics, store_course_analytics, recompute_final_scores
+)
+
+@shared_task(ignore_result=True)
+def export_grades_parquet(job_id, filters):
+    return run_parquet_export(job_id, EXPORT_COLUMNS, export_grade_rows(filters))
+
+@shared_task(ignore_result=True)
+def compute_grade_analytics(course_ids, key):
+    store_course_analytics(key, calculate_course_analytics(course_ids))
+
+@shared_task(ignore_result=True)
+def recompute_course_final_scores(course_id):
+    return recompute_final_scores(course_id)
@@ -1,15 +1,22 @@
 from rest_framework import viewsets, decorators, status
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework import permissions
-from .models import Grade
-from .serializers import GradeSerializer
-from .services import calculate_course_statistics
+from .models import Grade, GradingPolicy
+from .serializers import GradeSerializer, GradingPolicySerializer
+from .services import (
+    get_course_statistics, request_course_analytics, read_table_rows, import_grades, export_grade_rows, EXPORT_COLUMNS
+)
+from .tasks import export_grades_parquet
 from core.permissions import IsProfessor, IsStudent
+from core.pagination import GradePagination
+from core.exports import csv_response, start_parquet_export, export_job_response, export_filters, export_filename
 from courses.models import Course
 
 class GradeViewSet(viewsets.ModelViewSet):
     queryset = Grade.objects.all()
     serializer_class = GradeSerializer
+    pagination_class = GradePagination
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -19,10 +26,21 @@ class GradeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.is_student():
-            return Grade.objects.filter(student=user)
+            queryset = Grade.objects.filter(student=user)
         elif user.is_professor():
-            return Grade.objects.filter(course__professor=user)
-        return Grade.objects.none()
+            queryset = Grade.objects.filter(course__professor=user)
+        else:
+            return Grade.objects.none()
+
+        course_id = self.request.query_params.get('course_id')
+        if course_id:
+            if not course_id.isdigit():
+                raise ValidationError({"course_id": "Must be an integer."})
+            queryset = queryset.filter(course_id=course_id)
+        # Student name joined in, not fetched per row
+        return queryset.select_related('student').only(
+            'id', 'student_id', 'course_id', 'details', 'final_score', 'updated_at', 'student__username'
+        )
 
     @decorators.action(detail=False, methods=['get'], url_path='course-stats/(?P<course_id>\d+)')
     def course_stats(self, request, course_id=None):
@@ -30,7 +48,89 @@ class GradeViewSet(viewsets.ModelViewSet):
         if not Course.objects.filter(id=course_id, professor=request.user).exists():
             return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
             
-        stats = calculate_course_statistics(course_id)
+        stats = get_course_statistics(course_id)
         if stats:
             return Response(stats)
         return Response({"error": "No data found"}, status=status.HTTP_404_NOT_FOUND)
+
+    @decorators.action(detail=False, methods=['get', 'put'], url_path=r'policy/(?P<course_id>\d+)')
+    def policy(self, request, course_id=None):
+        # PUT replaces the course's grading policy; final scores are then recomputed
+        if not Course.objects.filter(id=course_id, professor=request.user).exists():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        policy = GradingPolicy.objects.filter(course_id=course_id).first()
+        if request.method == 'GET':
+            if policy is None:
+                return Response({"error": "No grading policy"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(GradingPolicySerializer(policy).data)
+
+        serializer = GradingPolicySerializer(policy, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(course_id=int(course_id))
+        return Response(serializer.data)
+
+    @decorators.action(detail=False, methods=['get'])
+    def analytics(self, request):
+        # /api/grades/analytics/?course_ids=1,2,3 (default: every course in scope)
+        # 202 while the report is being computed; poll the same URL for it
+        user = request.user
+        if user.is_admin():
+            courses = Course.objects.all()
+        elif user.is_professor():
+            courses = Course.objects.filter(professor=user)
+        else:
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        param = request.query_params.get('course_ids')
+        if param:
+            values = param.split(',')
+            if not all(value.isdigit() for value in values):
+                return Response({"error": "course_ids must be comma-separated integers"}, status=status.HTTP_400_BAD_REQUEST)
+            course_ids = {int(value) for value in values}
+            if set(courses.filter(id__in=course_ids).values_list('id', flat=True)) != course_ids:
+                return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        else:
+            course_ids = set(courses.values_list('id', flat=True))
+            if not course_ids:
+                return Response({"courses": {}})
+
+        analytics = request_course_analytics(course_ids)
+        if analytics is None:
+            return Response({"status": "pending"}, status=status.HTTP_202_ACCEPTED)
+        return Response({"courses": analytics})
+
+    @decorators.action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        # multipart: course_id, file (.csv or .xlsx; see import_grades for the columns)
+        course_id = request.data.get('course_id')
+        if not course_id or not str(course_id).isdigit():
+            return Response({"error": "course_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not Course.objects.filter(id=course_id, professor=request.user).exists():
+            return Response({"error": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            imported, errors = import_grades(int(course_id), read_table_rows(upload))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"imported": imported, "errors": errors})
+
+    @decorators.action(detail=False, methods=['get'])
+    def export(self, request):
+        # /api/grades/export/?course_id=1 (CSV, streamed)
+        filters, error = export_filters(request)
+        if error:
+            return error
+        return csv_response(export_filename('grades', filters, 'csv'), EXPORT_COLUMNS, export_grade_rows(filters))
+
+    @decorators.action(detail=False, methods=['post'], url_path='export/parquet')
+    def export_parquet(self, request):
+        # Same filters as export; written by a Celery task, fetch it from download_url
+        filters, error = export_filters(request)
+        if error:
+            return error
+        job_id = start_parquet_export(export_grades_parquet, request.user, export_filename('grades', filters, 'parquet'), filters)
+        return export_job_response(request, job_id)
@@ -0,0 +1,127 @@
+import json
+import pyotp
+import pytest
+import redis
+from unittest.mock import patch, AsyncMock, MagicMock, ANY
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+from courses.models import Course
+from attendance.models import Attendance, AttendanceSummary
+from attendance.async_services import averify_attendance
+from attendance.services import session_date
+from core.cache import TTLCache
+
+User = get_user_model()
+
+SECRET = pyotp.random_base32()
+SESSION = {b'secret': SECRET.encode('utf-8'), b'open': b'1', b'lat': b'0.0', b'lon': b'0.0', b'radius': b'50'}
+
+def fake_async_redis(*executes):
+    """redis.asyncio client whose pipelines return `executes` in turn."""
+    client = MagicMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=list(executes))
+    client.pipeline.return_value.__aenter__.return_value = pipe
+    client.set = AsyncMock(return_value=True)
+    client.get = AsyncMock(return_value=None)
+    client.delete = AsyncMock()
+    return client, pipe
+
+@pytest.fixture
+def check_in(settings):
+    """Runs averify_attendance against a mocked redis.asyncio client."""
+    settings.ATTENDANCE_WRITE_BEHIND = False
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    student = User.objects.create_user(username='student', role=User.Role.STUDENT)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+
+    def run(client, lat=0.0):
+        code = pyotp.TOTP(SECRET, interval=30).now()
+        # Disable the process-local session cache so every call reads the mocked Redis
+        with patch('attendance.async_services.get_async_redis', return_value=client), \
+                patch('attendance.services.session_cache', TTLCache(ttl=0)):
+            return async_to_sync(averify_attendance)(student, course.id, code, lat, 0.0)
+    return student, course, run
+
+@pytest.mark.django_db
+def test_async_check_in_success(check_in):
+    student, course, run = check_in
+    # HGETALL session, SMISMEMBER enrollment, GET claim; then the roster update
+    client, pipe = fake_async_redis([SESSION, [True, True], None], [])
+
+    assert run(client) == (True, "Attendance valid.")
+    claim = f'checkin_claim:{course.id}:{student.id}:{session_date()}'
+    client.set.assert_called_once_with(claim, Attendance.Status.PRESENT, nx=True, exat=ANY)
+    assert Attendance.objects.get(student=student, course=course).status == Attendance.Status.PRESENT
+    assert AttendanceSummary.objects.get(student=student, course=course).present == 1
+    pipe.publish.assert_called_once_with(
+        f'attendance_events:{course.id}:{session_date()}', json.dumps({"changes": [{"student_id": student.id, "status": "PRESENT"}]})
+    )
+
+@pytest.mark.django_db
+def test_async_check_in_rejections(check_in):
+    student, course, run = check_in
+
+    # Already claimed today: answered from the claim, nothing else runs
+    client, _ = fake_async_redis([SESSION, [True, True], b'PRESENT'])
+    assert run(client) == (True, "Already checked in.")
+    client.set.assert_not_called()
+
+    client, _ = fake_async_redis([SESSION, [False, True], None])
+    assert run(client) == (False, "You are not enrolled in this course.")
+
+    client, _ = fake_async_redis([{}, [True, True], None])
+    assert run(client) == (False, "Attendance session not active.")
+
+    client, _ = fake_async_redis([SESSION, [True, True], None])
+    success, message = run(client, lat=0.01) # ~1.1km away
+    assert not success and message.startswith("Location verification failed")
+    client.set.assert_not_called()
+
+    assert not Attendance.objects.exists()
+
+@pytest.mark.django_db
+def test_async_check_in_existing_record(check_in):
+    student, course, run = check_in
+    # Set by the professor before the student scanned
+    Attendance.objects.create(student=student, course=course, date=session_date(), status=Attendance.Status.LATE)
+    client, pipe = fake_async_redis([SESSION, [True, True], None])
+
+    assert run(client) == (False, "Attendance already recorded for today.")
+    claim = f'checkin_claim:{course.id}:{student.id}:{session_date()}'
+    client.set.assert_called_with(claim, 'RECORDED', exat=ANY)
+    assert Attendance.objects.get(student=student, course=course).status == Attendance.Status.LATE
+    pipe.publish.assert_not_called()
+
+@pytest.mark.django_db
+def test_async_check_in_failed_enqueue_releases_claim(check_in, settings):
+    student, course, run = check_in
+    settings.ATTENDANCE_WRITE_BEHIND = True
+    client, _ = fake_async_redis([SESSION, [True, True], None], redis.ConnectionError())
+
+    with pytest.raises(redis.ConnectionError):
+        run(client)
+    client.delete.assert_called_once_with(f'checkin_claim:{course.id}:{student.id}:{session_date()}')
+
+@pytest.mark.django_db
+def test_async_check_in_view(check_in):
+    student, course, _ = check_in
+    client, _ = fake_async_redis([SESSION, [True, True], None], [])
+    # Token buckets allow the request
+    client.register_script.return_value = AsyncMock(return_value=[1, '0'])
+
+    with patch('attendance.async_services.get_async_redis', return_value=client), \
+            patch('attendance.views.get_async_redis', return_value=client), \
+            patch('attendance.services.session_cache', TTLCache(ttl=0)):
+        response = async_to_sync(AsyncClient().post)(
+            '/api/attendance/check-in/async/',
+            {"course_id": course.id, "code": pyotp.TOTP(SECRET, interval=30).now(), "lat": 0.0, "lon": 0.0},
+            content_type='application/json',
+            headers={"Authorization": f"Bearer {AccessToken.for_user(student)}"}
+        )
+
+    assert response.status_code == 200
+    assert response.json() == {"message": "Attendance valid."}
+    assert Attendance.objects.filter(student=student, course=course).exists()
@@ -1,10 +1,20 @@
+import importlib
 import pytest
 import pyotp
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from courses.models import Course, Enrollment
-from attendance.models import Attendance
-from attendance.services import verify_attendance, generate_qr_token
-from unittest.mock import patch, MagicMock
+from courses.models import Course, Enrollment, CourseSchedule
+from attendance.models import Attendance, AttendanceSummary
+from attendance.services import (
+    verify_attendance, generate_qr_token, mark_absentees, bulk_update_statuses,
+    get_attendance_matrix, prewarm_upcoming_classes, get_attendance_sheet, close_ended_sessions,
+    flush_pending_check_ins, session_date
+)
+from core.cache import TTLCache
+from attendance.tokens import generate_signed_token, verify_signed_token
+from unittest.mock import patch, ANY
+from django.core.management import call_command
+from rest_framework.test import APIClient
 
 User = get_user_model()
 
@@ -24,28 +34,461 @@ def test_attendance_logic():
     # OR we use the real redis if running in environment where redis is up (GitHub Actions does).
     # Here, for stability, I will mock redis calls.
     
-    with patch('attendance.services.r') as mock_redis:
-        mock_redis.get.return_value = None # First call returns None
+    # Disable the process-local session cache so every call reads the mocked Redis
+    with patch('attendance.services.r') as mock_redis, \
+            patch('attendance.services.session_cache', TTLCache(ttl=0)):
+        # generate_qr_token pipeline: HSETNX secret, HGET open, HGET secret, SET opened marker
+        secret = pyotp.random_base32()
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        pipe.execute.return_value = [1, 0, secret.encode('utf-8'), True]
         
         # Verify Token Generation
-        # We need to mock setex to do nothing
-        mock_redis.setex = MagicMock()
-        
-        code, secret = generate_qr_token(course.id)
+        code, returned_secret = generate_qr_token(course.id)
         assert code is not None
-        assert secret is not None
+        assert returned_secret == secret
         
-        # Mock Redis get to return the secret now
-        mock_redis.get.return_value = secret.encode('utf-8')
+        # Session hash as stored by generate_qr_token + cache_course_location
+        # Course location (0,0), radius 50m
+        session = {
+            b'secret': secret.encode('utf-8'),
+            b'open': b'1',
+            b'lat': b'0.0',
+            b'lon': b'0.0',
+            b'radius': b'50',
+        }
+        # verify_attendance pipeline: HGETALL session, SMISMEMBER enrollment, GET duplicate claim
+        pipe.execute.return_value = [session, [True, True], None]
+        mock_redis.set.return_value = True
         
         # Verify Attendance (Successful)
-        # Assuming course location (0,0) and student location (0,0) -> 0 distance
-        success, msg = verify_attendance(student, course, code, 0, 0, 0, 0)
+        # Student location (0,0) -> 0 distance
+        success, msg = verify_attendance(student, course.id, code, 0, 0)
         assert success is True
         assert Attendance.objects.filter(student=student, course=course).exists()
 
         # Verify Attendance (Geo Fail)
         # Distance > 50m (approx 0.001 deg lat is ~111m)
-        success, msg = verify_attendance(student, course, code, 0.001, 0, 0, 0)
+        success, msg = verify_attendance(student, course.id, code, 0.001, 0)
         assert success is False
         assert "Location verification failed" in msg
+
+        # Verify Attendance (Session closed)
+        session[b'open'] = b'0'
+        success, msg = verify_attendance(student, course.id, code, 0, 0)
+        assert success is False
+        assert "closed" in msg
+
+        # Verify Attendance (Not enrolled)
+        session[b'open'] = b'1'
+        pipe.execute.return_value = [session, [False, True], None]
+        success, msg = verify_attendance(student, course.id, code, 0, 0)
+        assert success is False
+        assert "not enrolled" in msg
+
+        # Verify Attendance (Duplicate) is answered from the claim, before the DB
+        pipe.execute.return_value = [session, [True, True], b'PRESENT']
+        success, msg = verify_attendance(student, course.id, code, 0, 0)
+        assert success is True
+        assert "Already checked in" in msg
+        assert Attendance.objects.filter(student=student, course=course).count() == 1
+
+        # Unknown course / no session: rejected before any enrollment set is loaded
+        pipe.execute.return_value = [{}, [False, False], None]
+        success, msg = verify_attendance(student, 999, code, 0, 0)
+        assert (success, msg) == (False, "Attendance session not active.")
+        mock_redis.mget.assert_not_called()
+
+def test_signed_token(settings):
+    settings.ATTENDANCE_SIGNING_KEYS = ['new-key', 'old-key']
+    settings.ATTENDANCE_TOKEN_SKEW = 1
+    now = 1_700_000_000
+
+    token = generate_signed_token(1, for_time=now)
+    assert verify_signed_token(1, token, for_time=now)
+    # Clock skew: one interval either side is accepted, two is not
+    assert verify_signed_token(1, token, for_time=now + 30)
+    assert not verify_signed_token(1, token, for_time=now + 60)
+    # Bound to the course
+    assert not verify_signed_token(2, token, for_time=now)
+
+    # Key rotation: tokens signed with the previous key remain valid
+    settings.ATTENDANCE_SIGNING_KEYS = ['old-key']
+    old_token = generate_signed_token(1, for_time=now)
+    settings.ATTENDANCE_SIGNING_KEYS = ['new-key', 'old-key']
+    assert verify_signed_token(1, old_token, for_time=now)
+    settings.ATTENDANCE_SIGNING_KEYS = ['new-key']
+    assert not verify_signed_token(1, old_token, for_time=now)
+
+@pytest.mark.django_db
+def test_mark_absentees(settings):
+    settings.ATTENDANCE_WRITE_BEHIND = False
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(4)]
+    for student in students[:3]:
+        Enrollment.objects.create(student=student, course=course)
+    Enrollment.objects.filter(student=students[2]).update(is_active=False)
+    Attendance.objects.create(student=students[0], course=course, date='2024-03-04', status=Attendance.Status.LATE)
+
+    with patch('attendance.services.r') as mock_redis:
+        mock_redis.hgetall.return_value = {}
+        assert mark_absentees(course.id, '2024-03-04') == 1
+        # Running it again is a no-op
+        assert mark_absentees(course.id, '2024-03-04') == 0
+
+    statuses = dict(Attendance.objects.filter(course=course).values_list('student__username', 'status'))
+    assert statuses == {'s0': Attendance.Status.LATE, 's1': Attendance.Status.ABSENT}
+
+@pytest.mark.django_db
+def test_bulk_update_statuses():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    enrolled = User.objects.create_user(username='s1', role=User.Role.STUDENT)
+    outsider = User.objects.create_user(username='s2', role=User.Role.STUDENT)
+    Enrollment.objects.create(student=enrolled, course=course)
+    Attendance.objects.create(student=enrolled, course=course, date='2024-03-04', status=Attendance.Status.ABSENT)
+
+    rows = [
+        {'student_id': enrolled.id, 'date': '2024-03-04', 'status': Attendance.Status.LATE},
+        {'student_id': enrolled.id, 'date': '2024-03-05', 'status': Attendance.Status.PRESENT},
+        {'student_id': outsider.id, 'date': '2024-03-04', 'status': Attendance.Status.PRESENT},
+    ]
+    with patch('attendance.services.r'):
+        results = bulk_update_statuses(course.id, rows)
+
+    assert [success for success, _ in results] == [True, True, False]
+    statuses = dict(Attendance.objects.filter(course=course).values_list('date', 'status'))
+    assert {str(d): s for d, s in statuses.items()} == {'2024-03-04': 'LATE', '2024-03-05': 'PRESENT'}
+
+@pytest.mark.django_db
+def test_attendance_matrix():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    alice = User.objects.create_user(username='alice', role=User.Role.STUDENT)
+    bob = User.objects.create_user(username='bob', role=User.Role.STUDENT)
+    dropped = User.objects.create_user(username='carol', role=User.Role.STUDENT)
+    for student in (alice, bob):
+        Enrollment.objects.create(student=student, course=course)
+    Attendance.objects.bulk_create([
+        Attendance(student=alice, course=course, date='2024-03-04', status=Attendance.Status.PRESENT),
+        Attendance(student=alice, course=course, date='2024-03-06', status=Attendance.Status.LATE),
+        Attendance(student=bob, course=course, date='2024-03-06', status=Attendance.Status.ABSENT),
+        Attendance(student=dropped, course=course, date='2024-03-04', status=Attendance.Status.PRESENT),
+    ])
+
+    with patch('attendance.services.r') as mock_redis:
+        mock_redis.hgetall.return_value = {}
+        matrix = get_attendance_matrix(course)
+
+    assert [s['name'] for s in matrix['students']] == ['alice', 'bob', 'carol']
+    assert matrix['dates'] == ['2024-03-04', '2024-03-06']
+    assert matrix['rows'] == ['PL', '-A', 'P-']
+
+@pytest.mark.django_db
+def test_attendance_summary_maintained():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(2)]
+    for student in students:
+        Enrollment.objects.create(student=student, course=course)
+
+    def summary(student):
+        row = AttendanceSummary.objects.get(student=student, course=course)
+        return row.present, row.late, row.absent
+
+    with patch('attendance.services.r') as mock_redis:
+        mock_redis.hgetall.return_value = {}
+        bulk_update_statuses(course.id, [
+            {'student_id': students[0].id, 'date': '2024-03-04', 'status': Attendance.Status.PRESENT},
+            {'student_id': students[0].id, 'date': '2024-03-05', 'status': Attendance.Status.LATE},
+        ])
+        mark_absentees(course.id, '2024-03-04')
+        assert summary(students[0]) == (1, 1, 0)
+        assert summary(students[1]) == (0, 0, 1)
+
+        # Edits move the count between statuses
+        bulk_update_statuses(course.id, [
+            {'student_id': students[1].id, 'date': '2024-03-04', 'status': Attendance.Status.PRESENT},
+        ])
+        assert summary(students[1]) == (1, 0, 0)
+
+    AttendanceSummary.objects.all().delete()
+    call_command('rebuild_attendance_summary')
+    assert summary(students[0]) == (1, 1, 0)
+    assert summary(students[1]) == (1, 0, 0)
+
+    # The data migration fills the table the same way on deploy
+    AttendanceSummary.objects.all().delete()
+    migration = importlib.import_module('attendance.migrations.0004_backfill_attendancesummary')
+    migration.backfill_summaries(apps, None)
+    assert summary(students[0]) == (1, 1, 0)
+    assert summary(students[1]) == (1, 0, 0)
+
+@pytest.mark.django_db
+def test_attendance_csv_export():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    other = User.objects.create_user(username='other', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    other_course = Course.objects.create(name="Art", code="ART101", professor=other)
+    student = User.objects.create_user(username='s1', role=User.Role.STUDENT)
+    Attendance.objects.create(student=student, course=course, date='2024-03-04', status=Attendance.Status.PRESENT)
+    Attendance.objects.create(student=student, course=course, date='2024-05-04', status=Attendance.Status.LATE)
+    Attendance.objects.create(student=student, course=other_course, date='2024-03-04', status=Attendance.Status.ABSENT)
+
+    client = APIClient()
+    client.force_authenticate(prof)
+    response = client.get('/api/attendance/export/?end=2024-04-01')
+    assert response.status_code == 200
+    assert response.streaming
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert lines == [
+        'student_id,student_name,course_id,course_code,date,status',
+        f'{student.id},s1,{course.id},MATH101,2024-03-04,PRESENT',
+    ]
+
+    client.force_authenticate(student)
+    assert client.get('/api/attendance/export/').status_code == 403
+
+@pytest.mark.django_db
+def test_prewarm_upcoming_classes(settings):
+    from datetime import datetime, time
+    settings.ATTENDANCE_PREWARM_MINUTES = 10
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    soon = Course.objects.create(name="Math", code="MATH101", professor=prof, latitude=37.5, longitude=127.0)
+    later = Course.objects.create(name="Art", code="ART101", professor=prof)
+    student = User.objects.create_user(username='s1', role=User.Role.STUDENT)
+    Enrollment.objects.create(student=student, course=soon)
+    # 2024-03-04 is a Monday
+    CourseSchedule.objects.create(course=soon, day_of_week=0, start_time=time(9, 5), end_time=time(10))
+    CourseSchedule.objects.create(course=later, day_of_week=0, start_time=time(11), end_time=time(12))
+
+    with patch('attendance.services.r') as mock_redis:
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        pipe.execute.return_value = [True]
+        mock_redis.mget.return_value = [b'3']
+        assert prewarm_upcoming_classes(datetime(2024, 3, 4, 9, 0)) == 1
+
+    pipe.hset.assert_called_once_with(f'course_session:{soon.id}', mapping={'lat': 37.5, 'lon': 127.0, 'radius': 50})
+    # Enrollment set with the loaded marker (0), replaced only at the version read before the query
+    pipe.evalsha.assert_called_once_with(
+        ANY, 2, f'course_students:{soon.id}', f'course_students_version:{soon.id}', 3, 0, student.id
+    )
+
+@pytest.mark.django_db
+def test_sheet_reads_presence_bitmap():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(3)]
+    for student in students:
+        Enrollment.objects.create(student=student, course=course)
+    Attendance.objects.create(student=students[2], course=course, date='2024-03-04', status=Attendance.Status.LATE)
+
+    # Dense indexes: s0 -> 0, s1 -> 9 (second byte), s2 -> 1; bits 0 and 9 set
+    index = {b'__next__': b'10', str(students[0].id).encode(): b'0',
+             str(students[1].id).encode(): b'9', str(students[2].id).encode(): b'1'}
+    bitmap = bytes([0b10000000, 0b01000000])
+    with patch('attendance.services.r') as mock_redis:
+        mock_redis.pipeline.return_value.__enter__.return_value.execute.return_value = [bitmap, index]
+        sheet = get_attendance_sheet(course, '2024-03-04')
+
+    statuses = {row['student_name']: row['status'] for row in sheet}
+    assert statuses == {'s0': 'PRESENT', 's1': 'PRESENT', 's2': 'LATE'}
+
+@pytest.mark.django_db
+def test_bulk_check_in_endpoint():
+    from datetime import timedelta
+    from django.utils import timezone
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    other_prof = User.objects.create_user(username='prof2', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    other_course = Course.objects.create(name="Art", code="ART101", professor=other_prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(3)]
+
+    scanned_at = timezone.now() - timedelta(minutes=5)
+    day = timezone.localtime(scanned_at).date()
+    # Set by the professor before the upload arrived
+    Attendance.objects.create(student=students[2], course=course, date=day, status=Attendance.Status.LATE)
+
+    secret = pyotp.random_base32()
+    code = pyotp.TOTP(secret, interval=30).at(scanned_at)
+    # Closed since: scans recorded before the close are still accepted
+    state = {'open': '0', 'closed_at': str(timezone.now().timestamp()), 'secret': secret,
+             'lat': '0.0', 'lon': '0.0', 'radius': '50'}
+
+    def row(student, course_id=course.id, lat=0.0, scan_code=code):
+        return {"student_id": student.id, "course_id": course_id, "code": scan_code,
+                "timestamp": scanned_at.isoformat(), "lat": lat, "lon": 0.0}
+
+    client = APIClient()
+    client.force_authenticate(prof)
+    with patch('attendance.services.r') as mock_redis, \
+            patch('attendance.services.get_course_sessions', return_value={course.id: state}), \
+            patch('attendance.services.check_enrollments', side_effect=lambda pairs: [True] * len(pairs)):
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        # Claims for rows 0, 1 (repeat of 0) and 3, the RECORDED claim, then the roster update
+        pipe.execute.side_effect = [[True, False, True], [], []]
+        response = client.post('/api/attendance/check-in/bulk/', [
+            row(students[0]),
+            row(students[0]),
+            row(students[1], lat=0.01), # ~1.1km away
+            row(students[2]),
+            row(students[1], scan_code='000000' if code != '000000' else '111111'),
+            row(students[1], course_id=other_course.id),
+        ], format='json')
+
+    assert response.status_code == 200
+    verdicts = [(item['success'], item.get('message') or item.get('error')) for item in response.data['results']]
+    assert verdicts[0] == (True, "Attendance valid.")
+    assert verdicts[1] == (True, "Already checked in.")
+    assert not verdicts[2][0] and verdicts[2][1].startswith("Location verification failed")
+    assert verdicts[3] == (False, "Attendance already recorded.")
+    assert verdicts[4] == (False, "Invalid or expired QR code.")
+    assert verdicts[5] == (False, "Course not found or permission denied")
+    assert response.data['accepted'] == 2
+
+    statuses = dict(Attendance.objects.filter(course=course).values_list('student_id', 'status'))
+    assert statuses == {students[0].id: Attendance.Status.PRESENT, students[2].id: Attendance.Status.LATE}
+    pipe.set.assert_any_call(f'checkin_claim:{course.id}:{students[2].id}:{day}', 'RECORDED', exat=ANY)
+    # Only the inserted row reaches the live roster
+    pipe.publish.assert_called_once_with(
+        f'attendance_events:{course.id}:{day}', f'{{"changes": [{{"student_id": {students[0].id}, "status": "PRESENT"}}]}}'
+    )
+
+    # Students may only upload their own scans
+    client.force_authenticate(students[1])
+    response = client.post('/api/attendance/check-in/bulk/', [row(students[0])], format='json')
+    assert response.data['results'][0]['error'] == "Permission denied"
+
+@pytest.mark.django_db
+def test_close_ended_sessions_only_opened(settings):
+    from datetime import datetime, time
+    settings.ATTENDANCE_WRITE_BEHIND = False
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    held = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    cancelled = Course.objects.create(name="Art", code="ART101", professor=prof)
+    student = User.objects.create_user(username='s1', role=User.Role.STUDENT)
+    for course in (held, cancelled):
+        Enrollment.objects.create(student=student, course=course)
+        # 2024-03-04 is a Monday
+        CourseSchedule.objects.create(course=course, day_of_week=0, start_time=time(9), end_time=time(10))
+
+    with patch('attendance.services.r') as mock_redis:
+        mock_redis.set.return_value = True
+        mock_redis.hgetall.return_value = {}
+        # Only the first course's session was shown that day
+        mock_redis.mget.side_effect = lambda keys: [b'1' if key == f'session_opened:{held.id}:2024-03-04' else None for key in keys]
+        assert close_ended_sessions(datetime(2024, 3, 4, 10, 30)) == 1
+
+    assert list(Attendance.objects.values_list('course_id', 'status')) == [(held.id, Attendance.Status.ABSENT)]
+
+@pytest.mark.django_db
+def test_flush_pending_check_ins():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(3)]
+    entries = [
+        (f'1-{i}'.encode(), {
+            b'student_id': str(student.id).encode(), b'course_id': str(course.id).encode(),
+            b'date': b'2024-03-04', b'status': b'PRESENT',
+        })
+        for i, student in enumerate(students)
+    ]
+    pending = f'attendance_pending:{course.id}:2024-03-04'
+
+    with patch('attendance.services.r') as mock_redis:
+        lock = mock_redis.lock.return_value
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        # A full batch, then the short one that ends the drain
+        mock_redis.xrange.side_effect = [entries[:2], entries[2:]]
+        assert flush_pending_check_ins(batch_size=2) == 3
+
+        assert mock_redis.xrange.call_count == 2
+        assert [c.args for c in pipe.xdel.call_args_list] == [
+            ('attendance:checkins', b'1-0', b'1-1'), ('attendance:checkins', b'1-2')
+        ]
+        assert [c.args for c in pipe.hdel.call_args_list] == [
+            (pending, str(students[0].id), str(students[1].id)), (pending, str(students[2].id))
+        ]
+        lock.reacquire.assert_called_once()
+        lock.release.assert_called_once()
+
+        # Another worker holds the lock: nothing is read or written
+        mock_redis.reset_mock()
+        lock.acquire.return_value = False
+        assert flush_pending_check_ins(batch_size=2) == 0
+        mock_redis.xrange.assert_not_called()
+        lock.release.assert_not_called()
+
+    assert Attendance.objects.filter(course=course, status=Attendance.Status.PRESENT).count() == 3
+    assert AttendanceSummary.objects.filter(course=course, present=1).count() == 3
+
+@pytest.mark.django_db
+def test_offline_scan_replaces_closeout_absence():
+    from datetime import timedelta
+    from django.utils import timezone
+    from attendance.services import verify_bulk_attendance
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(2)]
+    closed_at = timezone.now() - timedelta(minutes=10)
+    day = timezone.localtime(closed_at).date()
+    # Written by the close-out while the phones were still offline
+    Attendance.objects.bulk_create([
+        Attendance(student=student, course=course, date=day, status=Attendance.Status.ABSENT) for student in students
+    ])
+    AttendanceSummary.objects.bulk_create([AttendanceSummary(student=student, course=course, absent=1) for student in students])
+
+    secret = pyotp.random_base32()
+    state = {'open': '0', 'closed_at': str(closed_at.timestamp()), 'secret': secret,
+             'lat': '0.0', 'lon': '0.0', 'radius': '50'}
+
+    def row(student, scanned_at):
+        return {"student_id": student.id, "course_id": course.id, "lat": 0.0, "lon": 0.0,
+                "code": pyotp.TOTP(secret, interval=30).at(scanned_at), "timestamp": scanned_at}
+
+    with patch('attendance.services.r') as mock_redis, \
+            patch('attendance.services.get_course_sessions', return_value={course.id: state}), \
+            patch('attendance.services.check_enrollments', side_effect=lambda pairs: [True] * len(pairs)):
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        pipe.execute.side_effect = [[True], []]
+        results = verify_bulk_attendance([
+            row(students[0], closed_at - timedelta(minutes=20)),
+            # Scanned after the close: still rejected
+            row(students[1], closed_at + timedelta(minutes=1)),
+        ])
+
+    assert results == [(True, "Attendance valid."), (False, "Attendance session is closed.")]
+    statuses = dict(Attendance.objects.filter(course=course).values_list('student_id', 'status'))
+    assert statuses == {students[0].id: Attendance.Status.PRESENT, students[1].id: Attendance.Status.ABSENT}
+    summary = AttendanceSummary.objects.get(student=students[0], course=course)
+    assert (summary.present, summary.absent) == (1, 0)
+    # Presence bit set and the roster told about the upgrade
+    pipe.evalsha.assert_called_once_with(
+        ANY, 3, f'presence_index:{course.id}', f'presence:{course.id}:{day}', 'presence:sessions',
+        students[0].id, 1, ANY, f'{course.id}:{day}'
+    )
+    pipe.publish.assert_called_once_with(
+        f'attendance_events:{course.id}:{day}', f'{{"changes": [{{"student_id": {students[0].id}, "status": "PRESENT"}}]}}'
+    )
+
+@pytest.mark.django_db
+def test_failed_enqueue_releases_claim(settings):
+    import redis
+    settings.ATTENDANCE_WRITE_BEHIND = True
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    student = User.objects.create_user(username='student', role=User.Role.STUDENT)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    secret = pyotp.random_base32()
+    session = {b'secret': secret.encode('utf-8'), b'open': b'1', b'lat': b'0.0', b'lon': b'0.0', b'radius': b'50'}
+
+    with patch('attendance.services.r') as mock_redis, \
+            patch('attendance.services.session_cache', TTLCache(ttl=0)), \
+            patch('attendance.services.enqueue_check_in', side_effect=redis.ConnectionError):
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        pipe.execute.return_value = [session, [True, True], None]
+        mock_redis.set.return_value = True
+        with pytest.raises(redis.ConnectionError):
+            verify_attendance(student, course.id, pyotp.TOTP(secret, interval=30).now(), 0.0, 0.0)
+
+    # Otherwise the student would be "Already checked in" with nothing recorded
+    mock_redis.delete.assert_called_once_with(f'checkin_claim:{course.id}:{student.id}:{session_date()}')
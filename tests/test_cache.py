@@ -0,0 +1,42 @@
+from unittest.mock import patch
+from core.cache import TTLCache
+
+def test_ttl_cache_expiry_and_counters():
+    cache = TTLCache(maxsize=4, ttl=30)
+    with patch('core.cache.time.monotonic', return_value=100.0) as clock:
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        clock.return_value = 130.0
+        assert cache.get('a') == 1
+        # Past its TTL the entry is dropped and counts as a miss
+        clock.return_value = 130.5
+        assert cache.get('a', 'gone') == 'gone'
+        assert cache.get('b') is None
+
+    assert cache.stats() == {
+        'size': 0, 'maxsize': 4, 'ttl': 30,
+        'hits': 2, 'misses': 2, 'evictions': 0, 'hit_rate': 0.5,
+    }
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # Reading 'a' makes 'b' the oldest entry
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+    cache.invalidate('a')
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 1
+
+def test_ttl_cache_disabled():
+    for cache in (TTLCache(ttl=0), TTLCache(maxsize=0)):
+        assert not cache.enabled
+        cache.set('a', 1)
+        assert cache.get('a') is None
+        assert cache.stats()['size'] == 0
+        assert cache.misses == 1
@@ -0,0 +1,167 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from courses.models import Course, Enrollment
+from grades.models import Grade
+from grades.services import (
+    calculate_course_statistics, get_course_statistics, calculate_course_analytics, stats_key, stats_version_key,
+    recompute_final_scores
+)
+
+User = get_user_model()
+
+@pytest.fixture
+def graded_course():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(4)]
+    Grade.objects.bulk_create([
+        Grade(student=student, course=course, details={"quiz": 5 + i, "midterm": 60 + 10 * i}, final_score=70.0 + 5 * i)
+        for i, student in enumerate(students)
+    ])
+    return course
+
+@pytest.mark.django_db
+def test_course_statistics_cached_per_version(graded_course, settings, django_assert_num_queries):
+    settings.GRADE_STATS_ENGINE = 'pandas'
+    store = {}
+    with patch('grades.services.r') as mock_redis:
+        mock_redis.mget.side_effect = lambda *keys: [store.get(key) for key in keys]
+        mock_redis.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value.encode('utf-8'))
+
+        with django_assert_num_queries(1):
+            stats = get_course_statistics(graded_course.id)
+        assert stats['count'] == 4
+        assert stats['mean_final'] == 77.5
+        assert stats['mean_midterm'] == 75.0
+
+        # Same version: served from Redis without touching the DB
+        with django_assert_num_queries(0):
+            assert get_course_statistics(graded_course.id) == stats
+
+        # A write bumps the version, so the cached entry no longer matches
+        store[stats_version_key(graded_course.id)] = b'1'
+        Grade.objects.filter(course=graded_course).update(final_score=100.0)
+        with django_assert_num_queries(1):
+            assert get_course_statistics(graded_course.id)['mean_final'] == 100.0
+        assert store[stats_key(graded_course.id)].startswith(b'1|')
+
+@pytest.mark.django_db
+def test_statistics_engines_agree(graded_course):
+    student = User.objects.create_user(username='late', role=User.Role.STUDENT)
+    other = User.objects.create_user(username='other', role=User.Role.STUDENT)
+    # Missing criteria, a null score and a criterion with no numeric values
+    Grade.objects.create(student=student, course=graded_course, details={"quiz": 9, "project": None}, final_score=None)
+    # Letter grades and nested criteria are not numbers for either engine
+    Grade.objects.create(student=other, course=graded_course, details={"quiz": "A+", "hw": {"a": 1}}, final_score=80.0)
+
+    pandas_stats = calculate_course_statistics(graded_course.id, engine='pandas')
+    sql_stats = calculate_course_statistics(graded_course.id, engine='sql')
+    assert sql_stats == pytest.approx(pandas_stats)
+    assert sql_stats['count'] == 6
+    assert sql_stats['mean_project'] is None
+    assert sql_stats['mean_hw'] is None
+    assert sql_stats['mean_quiz'] == (5 + 6 + 7 + 8 + 9) / 5
+
+    # A single grade: no sample deviation in either engine
+    course = graded_course.__class__.objects.create(name="Art", code="ART101", professor=graded_course.professor)
+    Grade.objects.create(student=student, course=course, details={"quiz": 3}, final_score=50.0)
+    assert calculate_course_statistics(course.id, engine='sql') == calculate_course_statistics(course.id, engine='pandas')
+    assert calculate_course_statistics(course.id, engine='sql')['std_final'] is None
+
+@pytest.mark.django_db
+def test_course_analytics_one_pass(graded_course, django_assert_num_queries):
+    other = Course.objects.create(name="Art", code="ART101", professor=graded_course.professor)
+    empty = Course.objects.create(name="Music", code="MUS101", professor=graded_course.professor)
+    students = list(User.objects.filter(role=User.Role.STUDENT))
+    Grade.objects.bulk_create([
+        Grade(student=student, course=other, details={"essay": 40 + i}, final_score=float(score))
+        for i, (student, score) in enumerate(zip(students, [5, 55, 95, 100]))
+    ])
+
+    with django_assert_num_queries(1):
+        analytics = calculate_course_analytics([graded_course.id, other.id, empty.id])
+
+    assert analytics[empty.id] is None
+    for course in (graded_course, other):
+        # Same summary as the single-course engines
+        stats = analytics[course.id]
+        assert {k: v for k, v in stats.items() if k in calculate_course_statistics(course.id, engine='pandas')} \
+            == pytest.approx(calculate_course_statistics(course.id, engine='pandas'))
+        scores = list(Grade.objects.filter(course=course).values_list('final_score', flat=True))
+        assert [stats['p10'], stats['p50'], stats['p90']] == pytest.approx(np.percentile(scores, [10, 50, 90]).tolist())
+
+    assert 'mean_quiz' not in analytics[other.id]
+    assert analytics[other.id]['histogram']['counts'] == [1, 0, 0, 0, 0, 1, 0, 0, 0, 2]
+    assert analytics[graded_course.id]['histogram']['counts'] == [0, 0, 0, 0, 0, 0, 0, 2, 2, 0]
+
+@pytest.mark.django_db
+def test_grade_csv_import(graded_course, django_assert_max_num_queries):
+    students = list(User.objects.filter(role=User.Role.STUDENT).order_by('id'))
+    Enrollment.objects.bulk_create([Enrollment(student=student, course=graded_course) for student in students[:3]])
+    outsider = students[3]
+    upload = SimpleUploadedFile('grades.csv', (
+        "username,final,final_score\n"
+        f"{students[0].username},88,91.5\n"
+        f"{students[1].username},,\n"
+        f"{outsider.username},70,70\n"
+        f"{students[2].username},abc,60\n"
+    ).encode('utf-8'))
+    client = APIClient()
+    client.force_authenticate(graded_course.professor)
+
+    # Enrollment, then one select + one upsert per batch, plus request overhead
+    with django_assert_max_num_queries(8):
+        response = client.post('/api/grades/import/', {'course_id': graded_course.id, 'file': upload}, format='multipart')
+    assert response.status_code == 200
+    assert response.data['imported'] == 2
+    assert response.data['errors'] == [
+        {"row": 4, "error": f"username '{outsider.username}' is not enrolled in this course."},
+        {"row": 5, "error": "Invalid score 'abc'"},
+    ]
+
+    grades = {grade.student_id: grade for grade in Grade.objects.filter(course=graded_course)}
+    # New criterion merged into the existing details; empty cells keep stored values
+    assert grades[students[0].id].details == {"quiz": 5, "midterm": 60, "final": 88}
+    assert grades[students[0].id].final_score == 91.5
+    assert grades[students[1].id].details == {"quiz": 6, "midterm": 70}
+    assert grades[students[1].id].final_score == 75.0
+
+@pytest.mark.django_db
+def test_grading_policy_recomputes_final_scores(graded_course, django_assert_num_queries, django_capture_on_commit_callbacks):
+    client = APIClient()
+    client.force_authenticate(graded_course.professor)
+    categories = {
+        # Quizzes out of 10, lowest dropped; the midterm capped at 100%
+        "quizzes": {"weight": 40, "criteria": ["quiz", "quiz2"], "max_points": 10, "drop_lowest": 1},
+        "exams": {"weight": 60, "criteria": ["midterm"], "max_points": 60, "cap": 100},
+    }
+    assert client.put(f'/api/grades/policy/{graded_course.id}/', {"categories": {"exams": {"weight": 1, "criteria": []}}},
+                      format='json').status_code == 400
+    with patch('grades.tasks.recompute_course_final_scores.delay') as delay, \
+            django_capture_on_commit_callbacks(execute=True):
+        response = client.put(f'/api/grades/policy/{graded_course.id}/', {"categories": categories, "final_cap": 95}, format='json')
+    assert response.status_code == 200
+    delay.assert_called_once_with(graded_course.id)
+
+    # The task body: policy and grades read, one UPDATE for the whole course (plus a savepoint)
+    with django_assert_num_queries(5):
+        assert recompute_final_scores(graded_course.id) == 4
+    scores = dict(Grade.objects.filter(course=graded_course).values_list('details__midterm', 'final_score'))
+    # Quiz 5 = 50% (missing quiz2 counts as 0 and is dropped), midterm 60/60 = 100%
+    assert scores[60] == 0.4 * 50 + 0.6 * 100
+    # Quiz 8 = 80%, midterm 90/60 capped at 100%
+    assert scores[90] == 0.4 * 80 + 0.6 * 100
+    assert recompute_final_scores(graded_course.id) == 0
+
+    # A single grade save applies the policy to the client's details, ignoring its final_score;
+    # 100% everywhere is held to final_cap
+    grade = Grade.objects.get(course=graded_course, details__midterm=60)
+    grade.details = {"quiz": 10, "quiz2": 10, "midterm": 90}
+    grade.final_score = 1.0
+    grade.save()
+    grade.refresh_from_db()
+    assert grade.final_score == 95.0
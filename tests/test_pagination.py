@@ -0,0 +1,75 @@
+import base64
+import json
+import pytest
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from courses.models import Course
+from attendance.models import Attendance
+from grades.models import Grade
+
+User = get_user_model()
+
+@pytest.fixture
+def course_data():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(6)]
+    start = date(2024, 3, 4)
+    Attendance.objects.bulk_create([
+        Attendance(student=student, course=course, date=start + timedelta(days=day), status=Attendance.Status.PRESENT)
+        for student in students for day in range(5)
+    ])
+    Grade.objects.bulk_create([Grade(student=student, course=course, details={"quiz": 1}) for student in students])
+    client = APIClient()
+    client.force_authenticate(prof)
+    return client, course
+
+def _walk(client, url, django_assert_num_queries):
+    """Follows every `next` link; each page must cost one query."""
+    rows = []
+    while url:
+        with django_assert_num_queries(1):
+            response = client.get(url)
+        assert response.status_code == 200
+        rows.extend(response.data['results'])
+        url = response.data['next']
+    return rows
+
+@pytest.mark.django_db
+def test_attendance_list_keyset_pages(course_data, django_assert_num_queries):
+    client, course = course_data
+    rows = _walk(client, f'/api/attendance/?course_id={course.id}&page_size=7', django_assert_num_queries)
+
+    assert len(rows) == 30
+    assert len({row['id'] for row in rows}) == 30
+    keys = [(row['date'], row['id']) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert rows[0]['student_name'].startswith('s')
+
+    response = client.get(f'/api/attendance/?course_id={course.id}&start=2024-03-07&end=2024-03-08')
+    assert {row['date'] for row in response.data['results']} == {'2024-03-07', '2024-03-08'}
+
+@pytest.mark.django_db
+def test_grade_list_keyset_pages(course_data, django_assert_num_queries):
+    client, course = course_data
+    rows = _walk(client, f'/api/grades/?course_id={course.id}&page_size=4', django_assert_num_queries)
+
+    assert [row['student_name'] for row in rows] == [f's{i}' for i in range(6)]
+
+@pytest.mark.django_db
+def test_invalid_cursor_is_not_found(course_data):
+    client, course = course_data
+
+    def cursor(position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    for url, position in [
+        ('/api/attendance/', ["x", "y"]),
+        ('/api/attendance/', ["2024-03-04", 1]),
+        ('/api/grades/', [str(course.id), "99999999999999999999999"]),
+        ('/api/grades/', [str(course.id)]),
+    ]:
+        response = client.get(f'{url}?course_id={course.id}&cursor={cursor(position)}')
+        assert response.status_code == 404
+    assert client.get(f'/api/grades/?course_id={course.id}&cursor=not-base64!').status_code == 404
@@ -0,0 +1,89 @@
+import pytest
+import redis
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from courses.models import Course
+from core.ratelimit import build_buckets, acquire
+
+User = get_user_model()
+
+class FakeTokenBucket:
+    """TOKEN_BUCKET_LUA with the clock stopped: no refill between calls."""
+    def __init__(self):
+        self.levels = {}
+        self.calls = 0
+
+    def __call__(self, keys, args):
+        self.calls += 1
+        levels = [self.levels.get(key, args[2 * i + 1]) for i, key in enumerate(keys)]
+        wait = max([(1 - level) / args[2 * i] for i, level in enumerate(levels) if level < 1], default=0)
+        if wait > 0:
+            return [0, str(wait)]
+        for key, level in zip(keys, levels):
+            self.levels[key] = level - 1
+        return [1, '0']
+
+@pytest.fixture
+def check_in_limits(settings):
+    settings.ATTENDANCE_RATE_LIMITS = {
+        'check_in_user': (0.5, 2),
+        'check_in_course': (0.25, 1),
+        'check_in_global': (1, 10),
+    }
+    settings.ATTENDANCE_COURSE_RATE_OVERRIDES = {"7": {"check_in_course": [10, 100]}}
+    return settings
+
+def test_buckets_use_course_overrides(check_in_limits):
+    assert build_buckets('check_in', user_id=1, course_id='3') == [
+        ('ratelimit:check_in_user:1', 0.5, 2),
+        ('ratelimit:check_in_course:3', 0.25, 1),
+        ('ratelimit:check_in_global:all', 1, 10),
+    ]
+    # Only the overridden scope changes; a bad course id drops the course bucket
+    assert build_buckets('check_in', user_id=1, course_id=7)[1] == ('ratelimit:check_in_course:7', 10, 100)
+    assert [key for key, _, _ in build_buckets('check_in', user_id=1, course_id='x')] == [
+        'ratelimit:check_in_user:1', 'ratelimit:check_in_global:all'
+    ]
+
+def test_acquire_is_all_or_nothing(check_in_limits):
+    bucket = FakeTokenBucket()
+    with patch('core.ratelimit.token_bucket', bucket):
+        assert acquire(build_buckets('check_in', user_id=1, course_id=3)) == (True, 0.0)
+        # Course bucket is empty: rejected with its refill time, and neither the
+        # user's nor the global bucket gives up a token
+        assert acquire(build_buckets('check_in', user_id=2, course_id=3)) == (False, 4.0)
+        assert 'ratelimit:check_in_user:2' not in bucket.levels
+        assert bucket.levels['ratelimit:check_in_global:all'] == 9
+        # Same user in an overridden course still has both tokens
+        assert acquire(build_buckets('check_in', user_id=2, course_id=7)) == (True, 0.0)
+        assert bucket.levels['ratelimit:check_in_user:2'] == 1
+    # One script call per request, whatever the number of buckets
+    assert bucket.calls == 3
+
+def test_acquire_fails_open():
+    with patch('core.ratelimit.token_bucket', side_effect=redis.ConnectionError):
+        assert acquire([('ratelimit:check_in_global:all', 1, 10)]) == (True, 0)
+
+@pytest.mark.django_db
+def test_check_in_throttled_with_retry_after(check_in_limits):
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    student = User.objects.create_user(username='student', role=User.Role.STUDENT)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    client = APIClient()
+    client.force_authenticate(student)
+
+    with patch('core.ratelimit.token_bucket', return_value=[0, '2.5']) as bucket, \
+            patch('attendance.views.verify_attendance') as verify:
+        response = client.post('/api/attendance/check-in/', {
+            "course_id": course.id, "code": "123456", "lat": 0.0, "lon": 0.0
+        }, format='json')
+
+    assert response.status_code == 429
+    assert response['Retry-After'] == '3'
+    assert bucket.call_args.kwargs['keys'] == [
+        f'ratelimit:check_in_user:{student.id}',
+        f'ratelimit:check_in_course:{course.id}',
+        'ratelimit:check_in_global:all',
+    ]
+    verify.assert_not_called()
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import pyotp
+import pytest
+from unittest.mock import patch, AsyncMock, MagicMock
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+from courses.models import Course, Enrollment
+from attendance.services import _events_message
+
+User = get_user_model()
+
+class FakePubSub:
+    """redis.asyncio PubSub that hands out the given messages, then times out."""
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.channels = []
+
+    async def subscribe(self, *channels):
+        self.channels.extend(channels)
+
+    async def unsubscribe(self, *channels):
+        pass
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=None):
+        await asyncio.sleep(0.01)
+        return self.messages.pop(0) if self.messages else None
+
+    async def aclose(self):
+        pass
+
+def fake_async_redis(messages=()):
+    client = MagicMock()
+    client.hmget = AsyncMock()
+    client.pubsub.side_effect = lambda: FakePubSub(messages)
+    return client
+
+async def read_stream(url, limit=None):
+    """SSE chunks of a streaming response, up to `limit` of them."""
+    response = await AsyncClient().get(url)
+    assert response.status_code == 200
+    chunks = []
+    async for chunk in response.streaming_content:
+        chunks.append(chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk)
+        if len(chunks) == limit:
+            break
+    # Let the broadcaster's listener see there is nobody left
+    await asyncio.sleep(0.05)
+    return chunks
+
+@pytest.fixture
+def professor_course():
+    prof = User.objects.create_user(username='prof', role=User.Role.PROFESSOR)
+    course = Course.objects.create(name="Math", code="MATH101", professor=prof)
+    return prof, course
+
+@pytest.mark.django_db
+def test_qr_stream_never_reopens_a_closed_session(professor_course):
+    prof, course = professor_course
+    url = f'/api/attendance/qr-stream/{course.id}/?token={AccessToken.for_user(prof)}'
+    secret = pyotp.random_base32().encode('utf-8')
+    # The close-out publishes an invalidation while the screen is connected
+    client = fake_async_redis(messages=[{'data': str(course.id).encode('utf-8')}])
+    client.hmget.side_effect = [[b'1', secret], [b'0', secret], [b'0', secret]]
+
+    with patch('attendance.services.r') as mock_redis, \
+            patch('attendance.async_services.get_async_redis', return_value=client), \
+            patch('attendance.streams.get_async_redis', return_value=client):
+        chunks = async_to_sync(read_stream)(url)
+        # EventSource reconnecting after the stream ended
+        reconnect = async_to_sync(read_stream)(url)
+
+    assert chunks[0].startswith('event: code\n')
+    assert chunks[1] == f'event: closed\ndata: {{"course_id": {course.id}}}\n\n'
+    assert len(chunks) == 2
+    assert reconnect == [chunks[1]]
+    # Connections only read the session, they never (re)open it
+    assert mock_redis.method_calls == []
+    assert {call[0] for call in client.method_calls} == {'hmget', 'pubsub'}
+
+@pytest.mark.django_db
+def test_roster_stream_delivers_changes(professor_course):
+    prof, course = professor_course
+    students = [User.objects.create_user(username=f's{i}', role=User.Role.STUDENT) for i in range(2)]
+    for student in students:
+        Enrollment.objects.create(student=student, course=course)
+    outsider = User.objects.create_user(username='outsider', role=User.Role.STUDENT)
+
+    # A check-in published by record_attendance_changes (the outsider is not on the sheet)
+    pubsub = FakePubSub([{'data': _events_message({outsider.id: 'PRESENT', students[0].id: 'PRESENT'})}])
+    client = MagicMock()
+    client.pubsub.return_value = pubsub
+    url = f'/api/attendance/roster-stream/?course_id={course.id}&date=2024-03-04&token={AccessToken.for_user(prof)}'
+
+    with patch('attendance.services.r') as mock_redis, \
+            patch('attendance.streams.get_async_redis', return_value=client):
+        # Presence bitmap and index: nobody checked in yet
+        mock_redis.pipeline.return_value.__enter__.return_value.execute.return_value = [None, {}]
+        chunks = async_to_sync(read_stream)(url, limit=2)
+
+    assert pubsub.channels == [f'attendance_events:{course.id}:2024-03-04']
+    event, data = chunks[0].split('\n')[:2]
+    assert event == 'event: roster'
+    roster = json.loads(data.removeprefix('data: '))
+    assert (roster['present'], roster['total']) == (0, 2)
+    assert {row['status'] for row in roster['students']} == {'NONE'}
+    assert chunks[1] == 'event: update\ndata: ' + json.dumps(
+        {"student_id": students[0].id, "status": "PRESENT", "present": 1, "total": 2}
+    ) + '\n\n'